@@ -8,45 +8,204 @@ Ora:
 - Comando "list ANOMALY" incluso.
 """
 
+import datetime as dt
 import sqlite3
+import sys
+import time
+from operator import itemgetter
+
+try:
+    # apsw espone l'API C di SQLite con meno overhead per chiamata e ha una
+    # statement cache integrata; se non è installato si usa sqlite3.
+    import apsw
+except ImportError:
+    apsw = None
+
 from prompt_toolkit import prompt
-from prompt_toolkit.completion import WordCompleter
+from prompt_toolkit.completion import NestedCompleter
 
 DB_FILE = "events.db"
 TABLE = "events"
 
+# Cache delle stringhe SQL: riusando lo stesso oggetto str ad ogni chiamata
+# la statement cache di SQLite riusa lo statement già preparato invece di
+# rifare parse/plan ad ogni query.
+_SQL_CACHE = {}
+
+# Introspezione dello schema fatta una volta sola in connect_db, invece che
+# riga per riga dentro query_db.
+_HAS_SQUAWK = False
+
+# Clausola condivisa dai tre comandi "list <tipo>": stesso testo SQL per
+# tutti, quindi la statement cache fa sempre hit al cambio di tipo.
+_WHERE_TYPE = "AND event_type=?"
+
+# Template di stampa specializzati per variante di schema: la scelta avviene
+# una volta sola a connect time, il loop caldo resta senza branch.
+_FMT_WITH_SQ = "[%s] %s HEX=%s FLT=%s REG=%s ALT=%s GS=%s SQ=%s NOTE=%s"
+_FMT_NO_SQ = "[%s] %s HEX=%s FLT=%s REG=%s ALT=%s GS=%s SQ= NOTE=%s"
+_ROW_FMT = _FMT_NO_SQ
+
+# Cache stile auxdata di SQLite: lo stesso statement preparato riusa lo
+# stesso tuple description, quindi la chiave id() fa hit dalla seconda query
+# in poi e la risoluzione nome→indice non viene ricalcolata.
+_GETTER_CACHE = {}
+
+def _row_getter(description):
+    key = id(description)
+    get = _GETTER_CACHE.get(key)
+    if get is None:
+        col_idx = {d[0]: i for i, d in enumerate(description)}
+        names = ["first_seen_utc", "event_type", "hex", "callsign", "reg",
+                 "alt_ft", "gs_kt"]
+        if _HAS_SQUAWK:
+            names.append("squawk")
+        names.append("note")
+        get = itemgetter(*(col_idx[n] for n in names))
+        if len(_GETTER_CACHE) > 8:
+            _GETTER_CACHE.clear()
+        _GETTER_CACHE[key] = get
+    return get
+
+# Cache dei risultati con TTL breve: ripetere lo stesso comando entro un
+# secondo non tocca il DB (durante la sessione CLI nessuno scrive).
+_RESULT_CACHE = {}
+_RESULT_TTL = 1.0
+
+def _sql_for(where=""):
+    sql = _SQL_CACHE.get(where)
+    if sql is None:
+        # first_seen_utc è ISO-8601 UTC, quindi l'ordinamento lessicografico
+        # coincide con quello temporale: niente datetime() sulla colonna,
+        # così SQLite può usare direttamente l'indice.
+        sql = f"SELECT * FROM {TABLE} WHERE 1=1 {where} ORDER BY first_seen_utc DESC LIMIT 50"
+        _SQL_CACHE[where] = sql
+    return sql
+
+# Setup una tantum della connessione: WAL evita che le letture blocchino chi
+# scrive, mmap riduce i syscall di lettura; l'indice coprente per i filtri per
+# tipo trasforma la query in un range scan che si ferma dopo LIMIT righe; gli
+# indici NOCASE su hex/callsign rendono i LIKE 'prefisso%' dei range scan.
+_SETUP_SQL = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+    f"CREATE INDEX IF NOT EXISTS ix_events_type_ts "
+    f"ON {TABLE}(event_type, first_seen_utc DESC)",
+    f"CREATE INDEX IF NOT EXISTS ix_hex ON {TABLE}(hex COLLATE NOCASE)",
+    f"CREATE INDEX IF NOT EXISTS ix_callsign ON {TABLE}(callsign COLLATE NOCASE)",
+)
+
 def connect_db():
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
+    if apsw is not None:
+        conn = apsw.Connection(DB_FILE)
+    else:
+        conn = sqlite3.connect(DB_FILE, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+    cur = conn.cursor()
+    for stmt in _SETUP_SQL:
+        try:
+            cur.execute(stmt)
+        except Exception:
+            # DB appena creato, senza la tabella events: gli indici verranno
+            # creati alla prossima apertura, dopo il primo import.
+            pass
+    if apsw is None:
+        conn.commit()
+    global _HAS_SQUAWK, _ROW_FMT
+    _HAS_SQUAWK = "squawk" in {row[1] for row in cur.execute(f"PRAGMA table_info({TABLE})")}
+    _ROW_FMT = _FMT_WITH_SQ if _HAS_SQUAWK else _FMT_NO_SQ
     return conn
 
+def _like_pattern(text):
+    """Match per prefisso di default; '*testo' per il match 'contiene'."""
+    if text.startswith("*"):
+        return f"%{text[1:]}%"
+    return f"{text}%"
+
 def query_db(conn, where="", params=()):
-    q = f"SELECT * FROM {TABLE} WHERE 1=1 {where} ORDER BY datetime(first_seen_utc) DESC LIMIT 50"
-    cur = conn.execute(q, params)
-    rows = cur.fetchall()
-    for r in rows:
-        print(
-            f"[{r['first_seen_utc']}] {r['event_type']} "
-            f"HEX={r['hex']} FLT={r['callsign']} REG={r['reg']} "
-            f"ALT={r['alt_ft']} GS={r['gs_kt']} "
-            f"SQ={r['squawk'] if 'squawk' in r.keys() else ''} "
-            f"NOTE={r['note']}"
-        )
-    print(f"--- {len(rows)} risultati ---")
+    q = _sql_for(where)
+    key = (q, params)
+    now = time.monotonic()
+    hit = _RESULT_CACHE.get(key)
+    if hit is not None and now - hit[0] < _RESULT_TTL:
+        sys.stdout.write(hit[1])
+        return
+    # row_factory azzerata solo sul cursore: questo cursore restituisce
+    # tuple C-level, il resto della connessione continua a dare sqlite3.Row.
+    # (apsw restituisce già tuple di default.)
+    cur = conn.cursor()
+    if apsw is None:
+        cur.row_factory = None
+    cur.execute(q, params)
+    # La prima riga va estratta PRIMA di leggere cur.description: con apsw
+    # la description esiste solo a statement in esecuzione, e una SELECT
+    # senza risultati è già completata dopo execute() (ExecutionCompleteError).
+    it = iter(cur)
+    first = next(it, None)
+    if first is None:
+        lines = []
+    else:
+        get = _row_getter(cur.description)
+        fmt = _ROW_FMT
+        # Streaming dal cursore: niente fetchall, le righe vengono formattate
+        # man mano che SQLite le produce.
+        lines = [fmt % get(first)]
+        lines.extend(fmt % get(r) for r in it)
+    lines.append(f"--- {len(lines)} risultati ---\n")
+    out = "\n".join(lines)
+    _RESULT_CACHE[key] = (now, out)
+    sys.stdout.write(out)
 
 def show_menu():
     conn = connect_db()
-    commands = [
-        "list all",
-        "list PATTERN",
-        "list PROX",
-        "list ANOMALY",   # aggiunto
-        "filter hex",
-        "filter callsign",
-        "filter date",
-        "quit"
-    ]
-    completer = WordCompleter(commands, ignore_case=True)
+    # Completamento gerarchico: dopo il primo token la ricerca si restringe
+    # ai soli sotto-comandi invece di scandire l'intera lista ad ogni tasto.
+    completer = NestedCompleter.from_nested_dict({
+        "list": {"all": None, "PATTERN": None, "PROX": None, "ANOMALY": None},
+        "filter": {"hex": None, "callsign": None, "date": None},
+        "quit": None,
+    })
+
+    def filter_hex():
+        hx = prompt("HEX (prefisso, '*' davanti per 'contiene'): ").strip().lower()
+        query_db(conn, "AND hex LIKE ?", (_like_pattern(hx),))
+
+    def filter_callsign():
+        cs = prompt("Callsign (prefisso, '*' davanti per 'contiene'): ").strip().upper()
+        query_db(conn, "AND callsign LIKE ?", (_like_pattern(cs),))
+
+    def filter_date():
+        since = prompt("Da data (YYYY-MM-DD): ").strip()
+        until = prompt("A data (YYYY-MM-DD): ").strip()
+        try:
+            # Range semiaperto su stringhe ISO grezze: senza datetime()
+            # sulla colonna SQLite può usare l'indice come range scan.
+            s_dt = f"{since} 00:00:00"
+            u_day = dt.date.fromisoformat(until) + dt.timedelta(days=1)
+            u_dt = f"{u_day.isoformat()} 00:00:00"
+            query_db(conn,
+                     "AND first_seen_utc >= ? AND first_seen_utc < ?",
+                     (s_dt, u_dt))
+        except Exception as e:
+            print("[ERR] Formato data non valido", e)
+
+    def list_type(ev_type):
+        return lambda: query_db(conn, _WHERE_TYPE, (ev_type,))
+
+    # Tabella di dispatch costruita una volta sola: lookup O(1) al posto
+    # della catena di confronti stringa.
+    dispatch = {
+        "list all": lambda: query_db(conn),
+        "list pattern": list_type("PATTERN"),
+        "list prox": list_type("PROX"),
+        "list anomaly": list_type("ANOMALY"),
+        "filter hex": filter_hex,
+        "filter callsign": filter_callsign,
+        "filter date": filter_date,
+    }
 
     while True:
         cmd = prompt("events> ", completer=completer).strip().lower()
@@ -54,38 +213,9 @@ def show_menu():
         if cmd in ("quit", "exit"):
             break
 
-        elif cmd == "list all":
-            query_db(conn)
-
-        elif cmd == "list pattern":
-            query_db(conn, "AND event_type=?", ("PATTERN",))
-
-        elif cmd == "list prox":
-            query_db(conn, "AND event_type=?", ("PROX",))
-
-        elif cmd == "list anomaly":
-            query_db(conn, "AND event_type=?", ("ANOMALY",))
-
-        elif cmd == "filter hex":
-            hx = prompt("HEX (parziale): ").strip().lower()
-            query_db(conn, "AND hex LIKE ?", (f"%{hx}%",))
-
-        elif cmd == "filter callsign":
-            cs = prompt("Callsign (parziale): ").strip().upper()
-            query_db(conn, "AND callsign LIKE ?", (f"%{cs}%",))
-
-        elif cmd == "filter date":
-            since = prompt("Da data (YYYY-MM-DD): ").strip()
-            until = prompt("A data (YYYY-MM-DD): ").strip()
-            try:
-                s_dt = f"{since} 00:00:00"
-                u_dt = f"{until} 23:59:59"
-                query_db(conn,
-                         "AND datetime(first_seen_utc) BETWEEN datetime(?) AND datetime(?)",
-                         (s_dt, u_dt))
-            except Exception as e:
-                print("[ERR] Formato data non valido", e)
-
+        handler = dispatch.get(cmd)
+        if handler:
+            handler()
         else:
             print("Comando non riconosciuto. Usa tab-completion!")
 
@@ -10,35 +10,121 @@ Ora:
 import argparse
 import sqlite3
 import csv
+import io
 import os
+import queue
+import shutil
+import subprocess
+import threading
 
 DB_FILE = "/home/pi/flight_anom_gr/events.db"
 TABLE = "events"
 
+# SQL costanti a livello di modulo: passare sempre lo stesso oggetto str a
+# execute() permette alla statement cache di SQLite di evitare il re-parse.
+_SQL_ALL = f"SELECT * FROM {TABLE}"
+_SQL_BY_TYPE = f"SELECT * FROM {TABLE} WHERE event_type = ?"
+
 def connect_db():
-    conn = sqlite3.connect(DB_FILE)
+    # L'export fa solo SELECT: aprire in sola lettura evita di acquisire
+    # lock di scrittura. Niente immutable=1: events.db vive in WAL mode
+    # (events_cli/publish lo impostano persistente) e con immutable SQLite
+    # ignora il WAL, quindi le righe committate ma non ancora checkpointate
+    # sparirebbero dall'export senza alcun errore.
+    # check_same_thread=False: il cursore viene consumato dal thread
+    # produttore della pipeline di export (mai in concorrenza col main).
+    conn = sqlite3.connect(f"file:{DB_FILE}?mode=ro", uri=True,
+                           cached_statements=256, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    conn.executescript("""
+        PRAGMA query_only=ON;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA cache_size=-65536;
+        PRAGMA mmap_size=268435456;
+    """)
     return conn
 
+def _export_with_sqlite3_cli(out_file, event_type=None):
+    """Esporta con il binario sqlite3 in modalità CSV: la codifica resta
+    interamente in C e l'export diventa puramente disk-bound. Ritorna False
+    se il binario non è disponibile o l'esecuzione fallisce."""
+    exe = shutil.which("sqlite3")
+    if exe is None:
+        return False
+    sql = _SQL_ALL
+    if event_type:
+        # event_type arriva dalle choices di argparse: inline sicuro.
+        sql = f"{_SQL_ALL} WHERE event_type = '{event_type}'"
+    try:
+        with open(out_file, "wb") as f:
+            res = subprocess.run([exe, "-readonly", "-csv", "-header",
+                                  DB_FILE, sql],
+                                 stdout=f, stderr=subprocess.DEVNULL)
+        return res.returncode == 0
+    except Exception:
+        return False
+
 def export_csv(conn, out_file, event_type=None):
-    q = f"SELECT * FROM {TABLE}"
+    # Percorso veloce: shell-out al binario sqlite3 quando presente; in caso
+    # contrario si usa la pipeline Python qui sotto.
+    if _export_with_sqlite3_cli(out_file, event_type):
+        print(f"[INFO] Eventi esportati in {out_file} (sqlite3 -csv)")
+        return
+    # Tuple "grezze" direttamente dal cursore: csv.writer consuma l'iteratore
+    # in C senza materializzare tutte le righe né costruire dict intermedi.
+    conn.row_factory = None
     if event_type:
-        q += " WHERE event_type = ?"
-        rows = conn.execute(q, (event_type,)).fetchall()
+        cur = conn.execute(_SQL_BY_TYPE, (event_type,))
     else:
-        rows = conn.execute(q).fetchall()
+        cur = conn.execute(_SQL_ALL)
 
-    if not rows:
+    first = cur.fetchone()
+    if first is None:
         print("[INFO] Nessun evento trovato.")
         return
 
-    with open(out_file, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=rows[0].keys())
-        writer.writeheader()
-        for r in rows:
-            writer.writerow(dict(r))
+    # fetchmany con arraysize grande: un ingresso in C ogni 1024 righe
+    # invece del dispatch Python riga per riga dell'iteratore.
+    cur.arraysize = 1024
+
+    # Pipeline produttore/consumatore: il thread produttore estrae blocchi di
+    # righe da SQLite mentre il thread principale codifica e scrive il CSV;
+    # fetch e write si sovrappongono (entrambi rilasciano il GIL in C).
+    chunks = queue.Queue(maxsize=64)
+    _eof = object()
+
+    def _producer():
+        try:
+            while True:
+                chunk = cur.fetchmany()
+                if not chunk:
+                    break
+                chunks.put(chunk)
+        finally:
+            # Sempre, anche su errore: il consumatore non deve restare
+            # bloccato sulla get().
+            chunks.put(_eof)
+
+    producer = threading.Thread(target=_producer, daemon=True)
+
+    n = 1
+    # Buffer di scrittura da 1 MB: riduce i syscall di write di ~128x
+    # rispetto al default da 8 KB.
+    with io.TextIOWrapper(open(out_file, "wb", buffering=1 << 20),
+                          newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow([d[0] for d in cur.description])
+        writer.writerow(first)
+        producer.start()
+        while True:
+            chunk = chunks.get()
+            if chunk is _eof:
+                break
+            writer.writerows(chunk)
+            n += len(chunk)
+    producer.join()
 
-    print(f"[INFO] Esportati {len(rows)} eventi in {out_file}")
+    print(f"[INFO] Esportati {n} eventi in {out_file}")
 
 def main():
     ap = argparse.ArgumentParser(description="Esporta eventi da SQLite a CSV")
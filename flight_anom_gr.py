@@ -19,19 +19,71 @@ Funzionalità:
 """
 
 import argparse
+import atexit
 import csv
 import datetime as dt
+import functools
 import json
 import os
+import queue
 import sys
+import threading
 import time
 import fcntl
 import math
-from collections import defaultdict, deque
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import Dict, Iterable, List, Optional, Tuple
 
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    # Parser JSON nativo: 2-3x più veloce dello stdlib sui payload dei tile.
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    # Prefiltro spaziale per la prossimità: una query C al posto del doppio
+    # loop Python. Se scikit-learn manca si ricade sulla forza bruta.
+    from sklearn.neighbors import BallTree
+except ImportError:
+    BallTree = None
+
+try:
+    # Indice spaziale sui poligoni: con molti poligoni il test per punto
+    # passa da O(M) a O(log M + k). Senza shapely resta la scansione con
+    # reiezione bbox per anello.
+    from shapely.geometry import Point as ShapelyPoint, Polygon as ShapelyPolygon
+    from shapely.strtree import STRtree
+    from shapely.ops import unary_union
+    try:
+        from shapely import contains_xy as shapely_contains_xy  # shapely >= 2
+    except ImportError:
+        from shapely.vectorized import contains as shapely_contains_xy
+except ImportError:
+    STRtree = None
+    shapely_contains_xy = None
+
+try:
+    # JIT per i kernel scalari (haversine, differenza angolare): compilati
+    # nativi una volta all'import. Senza numba restano in puro Python.
+    from numba import njit
+except ImportError:
+    njit = None
+
+try:
+    # Ray-cast in C (pip_ext.pyx, compilato al volo da pyximport): niente
+    # array temporanei per anelli molto grandi. Senza Cython resta NumPy.
+    import pyximport
+    pyximport.install(language_level=3)
+    from pip_ext import point_in_ring_c
+except Exception:
+    point_in_ring_c = None
 
 # ---------------------------
 # Tiles Italia (fallback se non c’è un polygons-file)
@@ -54,6 +106,17 @@ HTTP_TIMEOUT = 15
 HTTP_RETRIES = 2
 HTTP_BACKOFF = 2.0
 
+# Sessione condivisa: keep-alive TLS tra i fetch (niente handshake per tile)
+# e retry con backoff gestiti da urllib3.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=8, pool_maxsize=16,
+    max_retries=Retry(total=HTTP_RETRIES, backoff_factor=HTTP_BACKOFF,
+                      status_forcelist=[429, 502, 503, 504])))
+
+# Squawk di emergenza: 7500 dirottamento, 7600 radio avaria, 7700 emergenza
+EMERGENCY_SQUAWKS = frozenset({"7500", "7600", "7700"})
+
 # Soglie anomalie default
 DEF_MAX_GS_KT = 650
 DEF_MIN_GS_KT = 35
@@ -81,6 +144,121 @@ class Aircraft:
     model_t: Optional[str] = None      # sigla breve (t)
     is_mil: bool = False
 
+class FleetSoA:
+    """Colonne NumPy speculari alla lista Aircraft del ciclo corrente (SoA).
+
+    I campi numerici vengono linearizzati una volta per ciclo in array
+    contigui (NaN dove il campo manca): gli stadi vettoriali leggono queste
+    colonne con maschere booleane, mentre la costruzione degli eventi
+    continua a usare gli oggetti Aircraft indicizzati per posizione.
+    """
+    __slots__ = ("n", "lat", "lon", "alt", "gs", "ts", "ground", "is_mil")
+
+    def __init__(self, aircraft: List[Aircraft]):
+        n = len(aircraft)
+        nan = float("nan")
+        self.n = n
+        self.lat = np.fromiter((a.lat if a.lat is not None else nan
+                                for a in aircraft), float, n)
+        self.lon = np.fromiter((a.lon if a.lon is not None else nan
+                                for a in aircraft), float, n)
+        self.alt = np.fromiter((a.alt_baro if a.alt_baro is not None else nan
+                                for a in aircraft), float, n)
+        self.gs = np.fromiter((a.gs if a.gs is not None else nan
+                               for a in aircraft), float, n)
+        self.ts = np.fromiter((a.ts if a.ts is not None else nan
+                               for a in aircraft), float, n)
+        self.ground = np.fromiter((a.ground is True for a in aircraft),
+                                  bool, n)
+        self.is_mil = np.fromiter((a.is_mil for a in aircraft), bool, n)
+
+class Track:
+    """Storico posizioni di un aereo in colonne NumPy contigue (SoA).
+
+    Sostituisce la deque di tuple: i detector leggono direttamente gli
+    array lat/lon senza ricostruire liste ad ogni ciclo. Gli aggregati
+    (estremi lat/lon, heading per segmento, istogramma delle heading a
+    bucket di 10°) vengono mantenuti in modo incrementale all'append:
+    il costo per ciclo è O(1) per aereo invece di O(T).
+    """
+    __slots__ = ("cap", "n", "lat", "lon", "_heads",
+                 "minlat", "maxlat", "minlon", "maxlon", "head_hist")
+
+    def __init__(self, cap: int = 120):
+        self.cap = cap
+        self.n = 0
+        self.lat = np.empty(cap, dtype=float)
+        self.lon = np.empty(cap, dtype=float)
+        self._heads = np.empty(max(cap - 1, 1), dtype=float)
+        self.minlat = self.maxlat = 0.0
+        self.minlon = self.maxlon = 0.0
+        self.head_hist = np.zeros(18, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return self.n
+
+    @property
+    def heads(self) -> "np.ndarray":
+        """Heading (gradi, NaN per punti coincidenti) tra punti consecutivi."""
+        return self._heads[:max(self.n - 1, 0)]
+
+    def _hist_add(self, h: float, delta: int) -> None:
+        if not math.isnan(h):
+            self.head_hist[int((h % 180.0) // 10.0)] += delta
+
+    def append(self, lat: float, lon: float) -> None:
+        recompute_extents = False
+        if self.n == self.cap:
+            # Shift di un posto (memmove in C): con cap=120 costa meno
+            # della contabilità di un vero ring buffer.
+            popped_lat = self.lat[0]
+            popped_lon = self.lon[0]
+            self._hist_add(self._heads[0], -1)
+            self.lat[:-1] = self.lat[1:]
+            self.lon[:-1] = self.lon[1:]
+            self._heads[:-1] = self._heads[1:]
+            self.n -= 1
+            # Gli estremi vanno ricalcolati solo se esce proprio un estremo.
+            recompute_extents = (popped_lat == self.minlat or popped_lat == self.maxlat or
+                                 popped_lon == self.minlon or popped_lon == self.maxlon)
+        self.lat[self.n] = lat
+        self.lon[self.n] = lon
+        self.n += 1
+        if self.n == 1:
+            self.minlat = self.maxlat = lat
+            self.minlon = self.maxlon = lon
+        elif recompute_extents:
+            la = self.lat[:self.n]
+            lo = self.lon[:self.n]
+            self.minlat = float(la.min())
+            self.maxlat = float(la.max())
+            self.minlon = float(lo.min())
+            self.maxlon = float(lo.max())
+        else:
+            if lat < self.minlat:
+                self.minlat = lat
+            elif lat > self.maxlat:
+                self.maxlat = lat
+            if lon < self.minlon:
+                self.minlon = lon
+            elif lon > self.maxlon:
+                self.maxlon = lon
+        if self.n >= 2:
+            dla = lat - self.lat[self.n - 2]
+            dlo = lon - self.lon[self.n - 2]
+            if dla == 0.0 and dlo == 0.0:
+                h = float("nan")
+            else:
+                h = math.degrees(math.atan2(dlo, dla)) % 360.0
+            self._heads[self.n - 2] = h
+            self._hist_add(h, 1)
+
+    def last_heading(self) -> Optional[float]:
+        if self.n < 2:
+            return None
+        h = self._heads[self.n - 2]
+        return None if math.isnan(h) else float(h)
+
 # ---------------------------
 # Funzioni utili
 # ---------------------------
@@ -109,15 +287,43 @@ def safe_bool(val) -> Optional[bool]:
 def now_utc_str() -> str:
     return dt.datetime.now(dt.timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
 
-def haversine_km(p1: Tuple[float, float], p2: Tuple[float, float]) -> float:
+def _haversine_km4(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    # Kernel a scalari "piatti" (niente tuple): la firma che numba sa
+    # compilare in nativo.
     R = 6371.0
-    lat1, lon1 = map(math.radians, p1)
-    lat2, lon2 = map(math.radians, p2)
+    lat1 = math.radians(lat1)
+    lon1 = math.radians(lon1)
+    lat2 = math.radians(lat2)
+    lon2 = math.radians(lon2)
     dlat = lat2 - lat1
     dlon = lon2 - lon1
     a = math.sin(dlat/2)**2 + math.cos(lat1)*math.cos(lat2)*math.sin(dlon/2)**2
     return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
 
+def _angle_diff4(a: float, b: float) -> float:
+    # Forma branchless: 180 - |d - 180| equivale a min(d, 360 - d).
+    return 180.0 - abs(abs(a - b) % 360.0 - 180.0)
+
+if njit is not None:
+    _haversine_km4 = njit(cache=True, fastmath=True)(_haversine_km4)
+    _angle_diff4 = njit(cache=True, fastmath=True)(_angle_diff4)
+    # Warmup: la compilazione avviene qui, non nel primo ciclo del monitor.
+    _haversine_km4(0.0, 0.0, 0.0, 0.0)
+    _angle_diff4(0.0, 0.0)
+
+def haversine_km(p1: Tuple[float, float], p2: Tuple[float, float]) -> float:
+    return _haversine_km4(p1[0], p1[1], p2[0], p2[1])
+
+def haversine_km_vec(a, b) -> "np.ndarray":
+    """Versione vettoriale di haversine_km: a e b sono array Nx2 (lat, lon),
+    ritorna le N distanze in km con una sola passata NumPy."""
+    a = np.radians(np.asarray(a, dtype=float))
+    b = np.radians(np.asarray(b, dtype=float))
+    dlat = b[:, 0] - a[:, 0]
+    dlon = b[:, 1] - a[:, 1]
+    h = np.sin(dlat / 2) ** 2 + np.cos(a[:, 0]) * np.cos(b[:, 0]) * np.sin(dlon / 2) ** 2
+    return 6371.0 * 2 * np.arctan2(np.sqrt(h), np.sqrt(1 - h))
+
 def heading(p1: Tuple[float, float], p2: Tuple[float, float]) -> Optional[float]:
     dy = p2[0] - p1[0]
     dx = p2[1] - p1[1]
@@ -126,55 +332,154 @@ def heading(p1: Tuple[float, float], p2: Tuple[float, float]) -> Optional[float]
     return math.degrees(math.atan2(dx, dy)) % 360
 
 def angle_diff_deg(a: float, b: float) -> float:
-    d = abs(a - b) % 360.0
-    return d if d <= 180.0 else 360.0 - d
+    return _angle_diff4(a, b)
+
+@functools.lru_cache(maxsize=4096)
+def _model_line_cached(model_desc: Optional[str],
+                       model_t: Optional[str]) -> Optional[str]:
+    if model_desc:
+        return f"MODEL: {model_desc}"
+    if model_t:
+        return f"MODEL: {model_t}"
+    return None
 
 def model_line(ac: Aircraft) -> Optional[str]:
-    if ac.model_desc:
-        return f"MODEL: {ac.model_desc}"
-    if ac.model_t:
-        return f"MODEL: {ac.model_t}"
-    return None
+    return _model_line_cached(ac.model_desc, ac.model_t)
 
 # ---------------------------
 # Fetch dei voli militari
 # ---------------------------
 def fetch_military() -> List[dict]:
     api_rate_guard()
-    last_exc = None
-    for attempt in range(HTTP_RETRIES + 1):
-        try:
-            r = requests.get(API_MIL, timeout=HTTP_TIMEOUT)
-            r.raise_for_status()
-            raw = r.json() or {}
-            # Debug non bloccante
-            print("[DEBUG] Risposta /v2/mil:", r.text[:500], file=sys.stderr)
-
-            if isinstance(raw, dict) and "ac" in raw:
-                data = raw["ac"]
-            elif isinstance(raw, dict) and "aircraft" in raw:
-                data = raw["aircraft"]
-            elif isinstance(raw, list):
-                data = raw
-            else:
-                return []
-
-            # Forza flag militare
-            for ac in data:
-                if isinstance(ac, dict):
-                    ac["force_mil"] = True
-            return data
-        except Exception as e:
-            last_exc = e
-            if attempt < HTTP_RETRIES:
-                time.sleep(HTTP_BACKOFF * (attempt + 1))
-    print(f"[WARN] Fetch militare fallito {API_MIL} — {last_exc}", file=sys.stderr)
-    return []
+    try:
+        r = SESSION.get(API_MIL, timeout=HTTP_TIMEOUT)
+        r.raise_for_status()
+        raw = (orjson.loads(r.content) if orjson is not None else r.json()) or {}
+        # Debug non bloccante
+        print("[DEBUG] Risposta /v2/mil:", r.text[:500], file=sys.stderr)
+
+        if isinstance(raw, dict) and "ac" in raw:
+            data = raw["ac"]
+        elif isinstance(raw, dict) and "aircraft" in raw:
+            data = raw["aircraft"]
+        elif isinstance(raw, list):
+            data = raw
+        else:
+            return []
+
+        # Forza flag militare
+        for ac in data:
+            if isinstance(ac, dict):
+                ac["force_mil"] = True
+        return data
+    except Exception as e:
+        print(f"[WARN] Fetch militare fallito {API_MIL} — {e}", file=sys.stderr)
+        return []
 
 # ---------------------------
 # GeoJSON loader & poligoni
 # ---------------------------
-def load_polygons_from_geojson(path: str) -> List[List[List[Tuple[float, float]]]]:
+# Sharding quadtree dei lati: oltre questa soglia di vertici l'anello viene
+# suddiviso ricorsivamente; le foglie senza lati rispondono in O(1) con il
+# flag dentro/fuori precalcolato.
+_SHARD_MIN_VERTS = 256
+_SHARD_MAX_EDGES = 32
+_SHARD_MAX_DEPTH = 8
+
+def _raycast(x: float, y: float, xi, yi, xj, yj) -> bool:
+    if point_in_ring_c is not None:
+        return bool(point_in_ring_c(x, y, xi, yi, xj, yj))
+    cond = ((yi > y) != (yj > y)) & (x < (xj - xi) * (y - yi) / (yj - yi + 1e-12) + xi)
+    return bool(np.bitwise_xor.reduce(cond))
+
+def _build_ring_shards(xi, yi, xj, yj, bbox):
+    """Quadtree dei lati di un anello grande.
+
+    Nodi: ("split", ym, xm, q00, q01, q10, q11) con i figli in ordine
+    (y<ym,x<xm), (y<ym,x>=xm), (y>=ym,x<xm), (y>=ym,x>=xm);
+    ("full", bool) per le foglie senza lati (tutto dentro o tutto fuori,
+    classificate con un ray-cast completo sul centro della cella);
+    ("edges",) per le foglie che contengono ancora lati, dove si ricade
+    sul ray-cast completo.
+    """
+    ex0 = np.minimum(xi, xj)
+    ex1 = np.maximum(xi, xj)
+    ey0 = np.minimum(yi, yj)
+    ey1 = np.maximum(yi, yj)
+
+    def build(y0, y1, x0, x1, idx, depth):
+        if idx.size == 0:
+            inside = _raycast((x0 + x1) / 2.0, (y0 + y1) / 2.0, xi, yi, xj, yj)
+            return ("full", inside)
+        if idx.size <= _SHARD_MAX_EDGES or depth >= _SHARD_MAX_DEPTH:
+            return ("edges",)
+        ym = (y0 + y1) / 2.0
+        xm = (x0 + x1) / 2.0
+        children = []
+        for qy0, qy1 in ((y0, ym), (ym, y1)):
+            for qx0, qx1 in ((x0, xm), (xm, x1)):
+                sub = idx[(ex0[idx] <= qx1) & (ex1[idx] >= qx0) &
+                          (ey0[idx] <= qy1) & (ey1[idx] >= qy0)]
+                children.append(build(qy0, qy1, qx0, qx1, sub, depth + 1))
+        return ("split", ym, xm, *children)
+
+    return build(bbox[0], bbox[1], bbox[2], bbox[3],
+                 np.arange(xi.size), 0)
+
+def _shard_lookup(node, y: float, x: float):
+    while node[0] == "split":
+        node = node[3 + 2 * (y >= node[1]) + (x >= node[2])]
+    return node
+
+def _prep_ring(ring: List[Tuple[float, float]]):
+    """Precalcola per un anello (lat, lon) gli array dei lati e il bbox:
+    il ray-cast diventa un'unica espressione booleana NumPy. Gli anelli
+    molto grandi ricevono anche il quadtree dei lati."""
+    pts = np.asarray(ring, dtype=float)
+    yi = pts[:, 0]
+    xi = pts[:, 1]
+    yj = np.roll(yi, -1)
+    xj = np.roll(xi, -1)
+    bbox = (float(yi.min()), float(yi.max()), float(xi.min()), float(xi.max()))
+    shards = None
+    if len(pts) >= _SHARD_MIN_VERTS:
+        shards = _build_ring_shards(xi, yi, xj, yj, bbox)
+    return (xi, yi, xj, yj, bbox, shards)
+
+# Indice STRtree e unione dei poligoni, costruiti al caricamento (se
+# shapely c'è): l'unione serve al filtro vettoriale dell'intera flotta.
+_POLY_TREE = None
+_POLY_GEOMS: List = []
+_POLY_UNION = None
+
+def _build_polygon_index(polys) -> None:
+    global _POLY_TREE, _POLY_GEOMS, _POLY_UNION
+    _POLY_TREE = None
+    _POLY_GEOMS = []
+    _POLY_UNION = None
+    if STRtree is None or not polys:
+        return
+    for poly in polys:
+        shell_x, shell_y = poly[0][0], poly[0][1]
+        holes = [list(zip(r[0], r[1])) for r in poly[1:]]
+        _POLY_GEOMS.append(ShapelyPolygon(list(zip(shell_x, shell_y)), holes))
+    _POLY_TREE = STRtree(_POLY_GEOMS)
+    _POLY_UNION = unary_union(_POLY_GEOMS)
+
+def filter_in_polygons(aircraft: List[Aircraft], polygons) -> List[Aircraft]:
+    """Filtra la flotta sui poligoni: una sola chiamata GEOS vettoriale su
+    tutte le coordinate quando shapely è disponibile, altrimenti il test
+    punto per punto."""
+    if _POLY_UNION is not None and shapely_contains_xy is not None:
+        lons = np.array([ac.lon if ac.lon is not None else np.nan
+                         for ac in aircraft], dtype=float)
+        lats = np.array([ac.lat if ac.lat is not None else np.nan
+                         for ac in aircraft], dtype=float)
+        mask = shapely_contains_xy(_POLY_UNION, lons, lats)
+        return [ac for ac, m in zip(aircraft, mask) if m]
+    return [ac for ac in aircraft if in_any_polygon(ac.lat, ac.lon, polygons)]
+
+def load_polygons_from_geojson(path: str) -> List[list]:
     with open(path, "r", encoding="utf-8") as f:
         data = json.load(f)
     polys = []
@@ -184,27 +489,31 @@ def load_polygons_from_geojson(path: str) -> List[List[List[Tuple[float, float]]
             gtype = geom.get("type")
             coords = geom.get("coordinates", [])
             if gtype == "Polygon":
-                polys.append([[(float(pt[1]), float(pt[0])) for pt in ring] for ring in coords])
+                polys.append([_prep_ring([(float(pt[1]), float(pt[0])) for pt in ring]) for ring in coords])
             elif gtype == "MultiPolygon":
                 for polycoords in coords:
-                    polys.append([[(float(pt[1]), float(pt[0])) for pt in ring] for ring in polycoords])
+                    polys.append([_prep_ring([(float(pt[1]), float(pt[0])) for pt in ring]) for ring in polycoords])
     elif isinstance(data, dict) and "polygons" in data:
         for poly in data["polygons"]:
-            polys.append([[(float(pt[0]), float(pt[1])) for pt in ring] for ring in poly])
+            polys.append([_prep_ring([(float(pt[0]), float(pt[1])) for pt in ring]) for ring in poly])
+    _build_polygon_index(polys)
     return polys
 
-def point_in_ring(point: Tuple[float, float], ring: List[Tuple[float, float]]) -> bool:
+def point_in_ring(point: Tuple[float, float], ring) -> bool:
     x, y = point[1], point[0]
-    inside = False
-    n = len(ring)
-    for i in range(n):
-        yi, xi = ring[i][0], ring[i][1]
-        yj, xj = ring[(i + 1) % n][0], ring[(i + 1) % n][1]
-        if ((yi > y) != (yj > y)) and (x < (xj - xi) * (y - yi) / (yj - yi + 1e-12) + xi):
-            inside = not inside
-    return inside
-
-def point_in_polygon(point: Tuple[float, float], polygon: List[List[Tuple[float, float]]]) -> bool:
+    xi, yi, xj, yj, bbox, shards = ring
+    # Reiezione veloce sul bbox prima del ray-cast vero e proprio.
+    if y < bbox[0] or y > bbox[1] or x < bbox[2] or x > bbox[3]:
+        return False
+    if shards is not None:
+        # Discesa O(profondità) nel quadtree: la maggior parte dei punti
+        # cade in celle senza lati e risponde col flag precalcolato.
+        node = _shard_lookup(shards, y, x)
+        if node[0] == "full":
+            return node[1]
+    return _raycast(x, y, xi, yi, xj, yj)
+
+def point_in_polygon(point: Tuple[float, float], polygon: List[list]) -> bool:
     if not polygon:
         return False
     if not point_in_ring(point, polygon[0]):
@@ -215,32 +524,65 @@ def point_in_polygon(point: Tuple[float, float], polygon: List[List[Tuple[float,
     return True
 
 def in_any_polygon(lat: Optional[float], lon: Optional[float],
-                   polygons: Iterable[List[List[Tuple[float, float]]]]) -> bool:
+                   polygons: Iterable[List[list]]) -> bool:
     if lat is None or lon is None:
         return False
+    if _POLY_TREE is not None:
+        p = ShapelyPoint(lon, lat)
+        for cand in _POLY_TREE.query(p):
+            # shapely 2 restituisce indici, shapely 1 geometrie
+            geom = _POLY_GEOMS[cand] if isinstance(cand, (int, np.integer)) else cand
+            if geom.contains(p):
+                return True
+        return False
     pt = (lat, lon)
     return any(point_in_polygon(pt, poly) for poly in polygons)
 
 # ---------------------------
 # Link generator
 # ---------------------------
-def make_links(ac: Aircraft) -> List[str]:
+@functools.lru_cache(maxsize=4096)
+def _links_cached(hex_: str, flight: str, reg: Optional[str]) -> Tuple[str, ...]:
+    # Memoizzata sull'identità (hex, flight, reg): lo stesso aereo genera
+    # le stesse stringhe per ogni alert del ciclo, inutile riformattarle.
     links = []
-    if ac.hex:
-        links.append(f"[ADSB.fi](https://globe.adsb.fi/?icao={ac.hex})")
-        links.append(f"[ADSB Exchange](https://globe.adsbexchange.com/?icao={ac.hex})")
-        links.append(f"[Planespotters](https://www.planespotters.net/hex/{ac.hex})")
-    if ac.flight:
-        links.append(f"[FlightAware](https://www.flightaware.com/it-IT/flight/{ac.flight})")
-    if ac.reg:
-        links.append(f"[AirHistory](https://www.airhistory.net/marks-all/{ac.reg})")
-        links.append(f"[JetPhotos](https://www.jetphotos.com/registration/{ac.reg})")
-    return links
+    if hex_:
+        links.append(f"[ADSB.fi](https://globe.adsb.fi/?icao={hex_})")
+        links.append(f"[ADSB Exchange](https://globe.adsbexchange.com/?icao={hex_})")
+        links.append(f"[Planespotters](https://www.planespotters.net/hex/{hex_})")
+    if flight:
+        links.append(f"[FlightAware](https://www.flightaware.com/it-IT/flight/{flight})")
+    if reg:
+        links.append(f"[AirHistory](https://www.airhistory.net/marks-all/{reg})")
+        links.append(f"[JetPhotos](https://www.jetphotos.com/registration/{reg})")
+    return tuple(links)
+
+def make_links(ac: Aircraft) -> List[str]:
+    return list(_links_cached(ac.hex, ac.flight, ac.reg))
 
 # ---------------------------
-# Rate limiting (lockfile locale, 1 req/s)
+# Rate limiting (1 req/s verso adsb.fi)
 # ---------------------------
+# Di default un lock in-process su clock monotonico: zero syscall e nessun
+# salto con gli aggiustamenti NTP. Con --shared-rate-lock si torna al
+# lockfile fcntl per coordinare più processi sullo stesso host.
+_RATE_LOCK = threading.Lock()
+_RATE_LAST_TS = 0.0
+_USE_SHARED_RATE_LOCK = False
+
 def api_rate_guard():
+    if _USE_SHARED_RATE_LOCK:
+        _api_rate_guard_shared()
+        return
+    global _RATE_LAST_TS
+    with _RATE_LOCK:
+        now = time.monotonic()
+        wait = 1.05 - (now - _RATE_LAST_TS)
+        if wait > 0:
+            time.sleep(wait)
+        _RATE_LAST_TS = time.monotonic()
+
+def _api_rate_guard_shared():
     lockfile = "/tmp/adsbfi_api.lock"
     with open(lockfile, "a+") as f:
         fcntl.flock(f, fcntl.LOCK_EX)
@@ -265,38 +607,40 @@ def api_rate_guard():
 def fetch_tile(lat: float, lon: float, rng_nm: int) -> List[dict]:
     api_rate_guard()
     url = API_TEMPLATE.format(lat=lat, lon=lon, rng=rng_nm)
-    last_exc = None
-    for attempt in range(HTTP_RETRIES + 1):
-        try:
-            r = requests.get(url, timeout=HTTP_TIMEOUT)
-            r.raise_for_status()
-            return r.json().get("aircraft", []) or []
-        except Exception as e:
-            last_exc = e
-            if attempt < HTTP_RETRIES:
-                time.sleep(HTTP_BACKOFF * (attempt + 1))
-    print(f"[WARN] Fetch fallito {url} — {last_exc}", file=sys.stderr)
-    return []
+    try:
+        r = SESSION.get(url, timeout=HTTP_TIMEOUT)
+        r.raise_for_status()
+        data = orjson.loads(r.content) if orjson is not None else r.json()
+        return data.get("aircraft", []) or []
+    except Exception as e:
+        print(f"[WARN] Fetch fallito {url} — {e}", file=sys.stderr)
+        return []
 
 # ---------------------------
 # Pattern detection migliorata
 # ---------------------------
-def detect_loop_or_racetrack(track: List[Tuple[float, float]],
+def detect_loop_or_racetrack(track: Track,
                              loop_close_km: float = 3.0,
                              min_points: int = 30,
                              min_span_km: float = 10.0,
                              min_laps: int = 2) -> Optional[str]:
-    if len(track) < min_points:
+    n = len(track)
+    if n < min_points:
         return None
 
-    dist_start_end = haversine_km(track[0], track[-1])
+    la = track.lat[:n]
+    lo = track.lon[:n]
+    dist_start_end = haversine_km((la[0], lo[0]), (la[-1], lo[-1]))
     if dist_start_end > loop_close_km:
         return None
 
-    lats = [p[0] for p in track]
-    lons = [p[1] for p in track]
-    span_lat = haversine_km((min(lats), min(lons)), (max(lats), min(lons)))
-    span_lon = haversine_km((min(lats), min(lons)), (min(lats), max(lons)))
+    # Estremi mantenuti incrementalmente dalla Track: niente min/max O(T)
+    # ad ogni ciclo.
+    lat0, lat1 = track.minlat, track.maxlat
+    lon0, lon1 = track.minlon, track.maxlon
+    spans = haversine_km_vec([(lat0, lon0), (lat0, lon0)],
+                             [(lat1, lon0), (lat0, lon1)])
+    span_lat, span_lon = float(spans[0]), float(spans[1])
     major = max(span_lat, span_lon)
     minor = min(span_lat, span_lon)
 
@@ -306,61 +650,56 @@ def detect_loop_or_racetrack(track: List[Tuple[float, float]],
     aspect_ratio = major / (minor + 1e-6)
     shape = "LOOP/CERCHIO" if aspect_ratio < 1.5 else "RACETRACK"
 
-    crossings = 0
-    mid_lat = (max(lats) + min(lats)) / 2
-    for i in range(len(track) - 1):
-        if (track[i][0] - mid_lat) * (track[i+1][0] - mid_lat) < 0:
-            crossings += 1
+    mid_lat = (lat1 + lat0) / 2
+    crossings = int(np.sum((la[:-1] - mid_lat) * (la[1:] - mid_lat) < 0))
     if crossings < min_laps * 2:
         return None
 
     return shape
 
-def detect_lawnmower(track: List[Tuple[float, float]],
+def detect_lawnmower(track: Track,
                      min_points: int = 14,
                      heading_tolerance: float = 15.0,
                      required_passes: int = 4,
                      min_span_km: float = 15.0) -> bool:
-    if len(track) < min_points:
+    n = len(track)
+    if n < min_points:
         return False
 
-    lats = [p[0] for p in track]
-    lons = [p[1] for p in track]
-    span = haversine_km((min(lats), min(lons)), (max(lats), max(lons)))
+    span = haversine_km((track.minlat, track.minlon),
+                        (track.maxlat, track.maxlon))
     if span < min_span_km:
         return False
 
-    heads = []
-    for i in range(len(track) - 1):
-        h = heading(track[i], track[i+1])
-        if h is None:
-            continue
-        heads.append(h % 180)
-    if not heads:
+    cached = track.heads
+    valid = cached[~np.isnan(cached)]
+    if valid.size == 0:
         return False
-
-    clusters = [[], []]
-    base = min(heads, key=lambda x: sum(angle_diff_deg(x, y) for y in heads))
-    for h in heads:
-        if angle_diff_deg(h, base) < heading_tolerance:
-            clusters[0].append(h)
-        elif angle_diff_deg((h+180) % 180, base) < heading_tolerance:
-            clusters[1].append(h)
-
-    if len(clusters[0]) < required_passes or len(clusters[1]) < required_passes:
+    h = valid % 180.0
+
+    # Medoide via matrice broadcast delle differenze angolari: una sola
+    # passata NumPy al posto di O(H^2) chiamate Python ad angle_diff_deg.
+    d = np.abs(h[:, None] - h[None, :]) % 360.0
+    d = 180.0 - np.abs(d - 180.0)
+    base = float(h[np.argmin(d.sum(axis=1))])
+
+    # Classificazione vettoriale nelle due famiglie (0=A, 1=B, -1=fuori),
+    # con la stessa coppia di predicati del vecchio if/elif.
+    da = 180.0 - np.abs(np.abs(h - base) % 360.0 - 180.0)
+    db = 180.0 - np.abs(np.abs((h + 180.0) % 180.0 - base) % 360.0 - 180.0)
+    fam = np.where(da < heading_tolerance, 0,
+                   np.where(db < heading_tolerance, 1, -1))
+
+    if (int(np.sum(fam == 0)) < required_passes or
+            int(np.sum(fam == 1)) < required_passes):
         return False
 
-    sequence = []
-    for h in heads:
-        if angle_diff_deg(h, base) < heading_tolerance:
-            sequence.append("A")
-        elif angle_diff_deg((h+180) % 180, base) < heading_tolerance:
-            sequence.append("B")
-    alternations = sum(1 for i in range(1, len(sequence)) if sequence[i] != sequence[i-1])
+    sequence = fam[fam >= 0]
+    alternations = int(np.sum(np.diff(sequence) != 0))
 
     return alternations >= (required_passes - 1)
 
-def detect_mesh(track: List[Tuple[float, float]],
+def detect_mesh(track: Track,
                 min_points: int = 40,
                 perpendicular_tolerance: float = 10.0,
                 min_crossings: int = 6,
@@ -368,43 +707,46 @@ def detect_mesh(track: List[Tuple[float, float]],
     if len(track) < min_points:
         return False
 
-    heads = [heading(track[i], track[i+1]) for i in range(len(track)-1)]
-    heads = [int(round((h or 0)/10.0)*10) % 180 for h in heads if h is not None]
-    if not heads:
+    # Bail-out O(1) dall'istogramma incrementale: servono almeno due bucket
+    # di heading distinti perché esistano due famiglie perpendicolari.
+    if int(np.count_nonzero(track.head_hist)) < 2:
         return False
 
-    uniq = sorted(set(heads))
-    pairs = [(a, b) for a in uniq for b in uniq
-             if abs(((a-b)+180)%180 - 90) <= perpendicular_tolerance]
-    if not pairs:
+    cached = track.heads
+    valid = cached[~np.isnan(cached)]
+    if valid.size == 0:
         return False
 
-    def family(h, a, b, tol):
-        if abs(((h-a)+180)%180) <= tol:
-            return "A"
-        if abs(((h-b)+180)%180) <= tol:
-            return "B"
-        return None
+    # Bucketizzazione branchless a passi di 10° e test di perpendicolarità
+    # come confronto broadcast 2D: niente doppio loop Python O(U²).
+    buckets = ((valid / 10.0).round().astype(np.int16) * 10) % 180
+    uniq = np.unique(buckets)
+    diff = np.abs(((uniq[:, None] - uniq[None, :] + 180) % 180) - 90)
+    pairs = np.argwhere(diff <= perpendicular_tolerance)
+    if pairs.size == 0:
+        return False
 
-    a, b = pairs[0]
-    fam_counts = {"A": 0, "B": 0}
-    crossings = 0
-    last = None
-
-    for h in heads:
-        f = family(h, a, b, perpendicular_tolerance)
-        if f:
-            fam_counts[f] += 1
-            if f != last:
-                crossings += 1
-                last = f
-
-    total = fam_counts["A"] + fam_counts["B"]
-    if total == 0:
+    # argwhere restituisce le coppie in ordine row-major: la prima coincide
+    # con quella che sceglieva il doppio ciclo.
+    a = int(uniq[pairs[0][0]])
+    b = int(uniq[pairs[0][1]])
+    tol = perpendicular_tolerance
+
+    # Classificazione in famiglie vettoriale: 0=A, 1=B, -1=fuori tolleranza.
+    da = ((buckets - a) + 180) % 180
+    db = ((buckets - b) + 180) % 180
+    fam = np.where(da <= tol, 0, np.where(db <= tol, 1, -1))
+    fam = fam[fam >= 0]
+    if fam.size == 0:
         return False
-    if fam_counts["A"]/total < min_family_ratio or fam_counts["B"]/total < min_family_ratio:
+
+    count_a = int(np.sum(fam == 0))
+    count_b = fam.size - count_a
+    total = fam.size
+    if count_a / total < min_family_ratio or count_b / total < min_family_ratio:
         return False
 
+    crossings = 1 + int(np.sum(np.diff(fam) != 0))
     return crossings >= min_crossings
 
 # ---------------------------
@@ -424,7 +766,7 @@ def detect_anomalies(ac: Aircraft, prev: Optional[Aircraft], dt_sec: Optional[fl
     elif ac.alt_baro is not None and ac.alt_baro <= 0:
         is_ground = True
 
-    if ac.squawk and str(ac.squawk).strip() in {"7500", "7600", "7700"}:
+    if ac.squawk and ac.squawk in EMERGENCY_SQUAWKS:
         seen.add(f"SQUAWK: #{ac.squawk}")
 
     if ac.gs is not None:
@@ -451,41 +793,264 @@ def detect_anomalies(ac: Aircraft, prev: Optional[Aircraft], dt_sec: Optional[fl
 
     return sorted(seen)
 
+def anomaly_candidate_mask(aircraft: List[Aircraft], fleet: FleetSoA,
+                           prev_state: Dict[str, Aircraft],
+                           min_alt_ft: int, max_alt_ft: int,
+                           min_gs_kt: float, max_gs_kt: float,
+                           max_vs_fpm: float, max_dgs_kts: float) -> "np.ndarray":
+    """Maschera booleana degli aerei che possono produrre anomalie.
+
+    Replica le stesse soglie di detect_anomalies ma in forma vettoriale
+    sulle colonne SoA: il confronto NaN è sempre False, quindi i campi
+    mancanti si comportano come i check "is not None" scalari. Il costo
+    per ciclo diventa proporzionale al numero di anomalie, non alla
+    flotta; detect_anomalies resta la fonte dei messaggi.
+    """
+    n = fleet.n
+    alt = fleet.alt
+    gs = fleet.gs
+
+    prev_alt = np.full(n, np.nan)
+    prev_gs = np.full(n, np.nan)
+    prev_ts = np.full(n, np.nan)
+    for k, ac in enumerate(aircraft):
+        prev = prev_state.get(ac.hex)
+        if prev is not None:
+            if prev.alt_baro is not None:
+                prev_alt[k] = prev.alt_baro
+            if prev.gs is not None:
+                prev_gs[k] = prev.gs
+            if prev.ts is not None:
+                prev_ts[k] = prev.ts
+
+    is_ground = (fleet.ground |
+                 ((alt <= 100) & (np.isnan(gs) | (gs < 60))) |
+                 (alt <= 0))
+
+    squawk_bad = np.fromiter(
+        (bool(ac.squawk) and ac.squawk in EMERGENCY_SQUAWKS
+         for ac in aircraft), bool, n)
+    gs_high = gs > max_gs_kt
+    gs_low = (gs < min_gs_kt) & ~is_ground
+    alt_high = alt > max_alt_ft
+    alt_low = (alt < min_alt_ft) & ~is_ground & (alt > 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dt_sec = fleet.ts - prev_ts
+        rate_ok = dt_sec > 0
+        dgs_bad = rate_ok & (np.abs(gs - prev_gs) > max_dgs_kts)
+        vs_bad = rate_ok & (np.abs((alt - prev_alt) / dt_sec * 60.0) > max_vs_fpm)
+
+    return squawk_bad | gs_high | gs_low | alt_high | alt_low | dgs_bad | vs_bad
+
 # ---------------------------
 # CSV & Telegram
 # ---------------------------
+_CSV_FIELDS = [
+    "first_seen_utc", "hex", "callsign", "reg",
+    "model_t",
+    "lat", "lon", "alt_ft", "gs_kt", "squawk", "ground",
+    "event_type", "note"
+]
+
+# Handle persistente sul CSV: aperto al primo append e tenuto per tutta
+# la vita del processo. Ogni open/close su SD card costa un fsync della
+# directory; così resta un flush() per batch e basta. Il lock serializza
+# worker I/O e thread del monitor (fallback inline a coda piena) sullo
+# stesso writer, altrimenti le righe possono interlacciarsi.
+_csv_lock = threading.Lock()
+_csv_fh = None
+_csv_wr = None
+_csv_fh_path: Optional[str] = None
+
+def _csv_writer(csv_path: str):
+    global _csv_fh, _csv_wr, _csv_fh_path
+    if _csv_fh is None or _csv_fh_path != csv_path:
+        if _csv_fh is not None:
+            _csv_fh.close()
+        must_write_header = not os.path.isfile(csv_path)
+        _csv_fh = open(csv_path, "a", buffering=8192,
+                       newline="", encoding="utf-8")
+        _csv_wr = csv.DictWriter(_csv_fh, fieldnames=_CSV_FIELDS)
+        _csv_fh_path = csv_path
+        if must_write_header:
+            _csv_wr.writeheader()
+    return _csv_wr, _csv_fh
+
+def _close_csv() -> None:
+    global _csv_fh, _csv_wr, _csv_fh_path
+    with _csv_lock:
+        if _csv_fh is not None:
+            try:
+                _csv_fh.close()
+            except Exception:
+                pass
+            _csv_fh = _csv_wr = _csv_fh_path = None
+
 def append_seen_csv(csv_path: str, rows: List[dict]) -> None:
-    must_write_header = not os.path.isfile(csv_path)
-    fieldnames = [
-        "first_seen_utc", "hex", "callsign", "reg",
-        "model_t",
-        "lat", "lon", "alt_ft", "gs_kt", "squawk", "ground",
-        "event_type", "note"
-    ]
+    """Accoda in un colpo solo tutte le righe evento di un ciclo.
+
+    Va chiamata una volta per ciclo, in coda al main loop: un solo
+    flush per periodo di monitoraggio invece di un open/close per alert.
+    """
+    if not rows:
+        return
     try:
-        with open(csv_path, "a", newline="", encoding="utf-8") as f:
-            wr = csv.DictWriter(f, fieldnames=fieldnames)
-            if must_write_header:
-                wr.writeheader()
+        with _csv_lock:
+            wr, fh = _csv_writer(csv_path)
             wr.writerows(rows)
+            fh.flush()
     except Exception as e:
         print(f"[WARN] Scrittura CSV fallita: {e}", file=sys.stderr)
+        _close_csv()
 
-def send_telegram(text: str) -> None:
+# Worker I/O dedicato: il ciclo del monitor accoda e basta, la scrittura
+# vera (open/append su SD card) avviene su un thread di background — lo
+# stesso schema del worker Telegram. Coda limitata: se l'I/O non sta
+# dietro si scrive in linea piuttosto che accumulare senza limite.
+_IO_QUEUE: "queue.Queue" = queue.Queue(maxsize=1000)
+_IO_WORKER_STARTED = False
+
+def _io_worker() -> None:
+    while True:
+        kind, payload = _IO_QUEUE.get()
+        try:
+            if kind == "csv":
+                append_seen_csv(payload[0], payload[1])
+        finally:
+            _IO_QUEUE.task_done()
+
+def _io_submit(item) -> bool:
+    global _IO_WORKER_STARTED
+    if not _IO_WORKER_STARTED:
+        threading.Thread(target=_io_worker, daemon=True).start()
+        _IO_WORKER_STARTED = True
+    try:
+        _IO_QUEUE.put_nowait(item)
+        return True
+    except queue.Full:
+        return False
+
+# Buffer delle righe evento tra un flush e l'altro: su SD card conviene
+# accumulare più cicli e pagare un solo open/append, invece di uno a tick.
+_CSV_FLUSH_N = 50
+_CSV_FLUSH_SECS = 300.0
+_pending_rows: List[dict] = []
+_last_csv_flush = time.monotonic()
+_pending_csv_path: Optional[str] = None
+
+def queue_seen_csv(csv_path: str, rows: List[dict]) -> None:
+    """Accoda le righe del ciclo; il flush parte quando il buffer supera
+    _CSV_FLUSH_N righe o sono passati _CSV_FLUSH_SECS dall'ultimo, e viene
+    eseguito dal worker I/O fuori dal path del monitor."""
+    global _last_csv_flush, _pending_csv_path
+    _pending_csv_path = csv_path
+    _pending_rows.extend(rows)
+    now = time.monotonic()
+    if _pending_rows and (len(_pending_rows) >= _CSV_FLUSH_N or
+                          now - _last_csv_flush >= _CSV_FLUSH_SECS):
+        batch = list(_pending_rows)
+        _pending_rows.clear()
+        _last_csv_flush = now
+        if not _io_submit(("csv", (csv_path, batch))):
+            append_seen_csv(csv_path, batch)
+
+def _flush_pending_csv() -> None:
+    # Registrata con atexit: anche su Ctrl-C le righe bufferizzate
+    # finiscono su disco. Prima si drena la coda del worker (i batch in
+    # volo sono più vecchi del buffer), poi si scrivono le righe pending:
+    # l'ordine cronologico sul CSV resta corretto allo shutdown.
+    if _IO_WORKER_STARTED:
+        _IO_QUEUE.join()
+    if _pending_rows and _pending_csv_path:
+        append_seen_csv(_pending_csv_path, _pending_rows)
+        _pending_rows.clear()
+    _close_csv()
+
+atexit.register(_flush_pending_csv)
+
+# Coda verso il worker Telegram: il ciclo del monitor accoda e basta,
+# l'HTTP (timeout 10 s a messaggio) resta tutto sul thread di background.
+_TG_QUEUE: "queue.Queue" = queue.Queue(maxsize=1000)
+_TG_WORKER_STARTED = False
+_TG_COALESCE_SECS = 2.0
+_TG_MAX_CHARS = 4000  # sotto il limite di 4096 di sendMessage
+
+_TG_MAX_RETRIES = 3
+
+def _tg_post(text: str, disable_notification: bool = False) -> None:
+    """Invia un messaggio gestendo il rate limit di Telegram.
+
+    Gira solo sul thread del worker, quindi può dormire: su 429 rispetta
+    il retry_after indicato dall'API e ritenta lo stesso messaggio, su
+    5xx fa backoff esponenziale. I 400 (messaggio malformato) vengono
+    loggati e scartati: ritentarli fallirebbe identico.
+    """
     token = os.getenv("TELEGRAM_BOT_TOKEN")
     chat_id = os.getenv("TELEGRAM_CHAT_ID")
     if not token or not chat_id:
         return
     url = f"https://api.telegram.org/bot{token}/sendMessage"
+    payload = {"chat_id": chat_id, "text": text,
+               "disable_web_page_preview": False,
+               "parse_mode": "Markdown",
+               "disable_notification": disable_notification}
+    for attempt in range(_TG_MAX_RETRIES + 1):
+        try:
+            r = SESSION.post(url, json=payload, timeout=10)
+        except Exception:
+            return
+        if r.status_code == 429:
+            try:
+                ra = float(r.json().get("parameters", {}).get("retry_after", 1))
+            except Exception:
+                ra = 1.0
+            time.sleep(ra)
+        elif 500 <= r.status_code < 600:
+            time.sleep(2 ** attempt)
+        else:
+            if r.status_code != 200:
+                print(f"[WARN] Telegram HTTP {r.status_code}: {r.text[:200]}",
+                      file=sys.stderr)
+            return
+
+def _tg_worker() -> None:
+    while True:
+        batch = [_TG_QUEUE.get()]
+        # Finestra di coalescenza: gli alert ravvicinati dello stesso ciclo
+        # finiscono in un unico messaggio (silenzioso) invece di una raffica.
+        deadline = time.monotonic() + _TG_COALESCE_SECS
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_TG_QUEUE.get(timeout=remaining))
+            except queue.Empty:
+                break
+        if len(batch) == 1:
+            _tg_post(batch[0])
+            continue
+        text = ""
+        for msg in batch:
+            if text and len(text) + len(msg) + 2 > _TG_MAX_CHARS:
+                _tg_post(text, disable_notification=True)
+                text = msg
+            else:
+                text = f"{text}\n\n{msg}" if text else msg
+        if text:
+            _tg_post(text, disable_notification=True)
+
+def send_telegram(text: str) -> None:
+    """Accoda il messaggio al worker: nessun I/O sul path del monitor."""
+    global _TG_WORKER_STARTED
+    if not _TG_WORKER_STARTED:
+        threading.Thread(target=_tg_worker, daemon=True).start()
+        _TG_WORKER_STARTED = True
     try:
-        requests.post(
-            url,
-            json={"chat_id": chat_id, "text": text,
-                  "disable_web_page_preview": False,
-                  "parse_mode": "Markdown"},
-            timeout=10
-        )
-    except Exception:
+        _TG_QUEUE.put_nowait(text)
+    except queue.Full:
+        # Meglio perdere un alert che bloccare il ciclo di monitoraggio.
         pass
 
 # ---------------------------
@@ -496,6 +1061,67 @@ def same_direction(h1: Optional[float], h2: Optional[float], tol_deg: float) ->
         return False
     return angle_diff_deg(h1, h2) <= tol_deg
 
+def prox_candidate_pairs(fleet: FleetSoA,
+                         proximity_km: float,
+                         alt_diff_ft: Optional[float] = None,
+                         gs_diff_kt: Optional[float] = None) -> List[Tuple[int, int, float]]:
+    """Coppie (i, j, dist_km) di aerei entro proximity_km.
+
+    Lavora sulle colonne SoA del ciclo. Con scikit-learn disponibile e una
+    flotta abbastanza grande usa un BallTree con metrica haversine: le
+    coppie candidate escono da una sola query C invece di N^2/2 haversine
+    in Python. Sotto soglia (o senza sklearn) la forza bruta resta più
+    conveniente: lì i prerequisiti economici (delta alt, delta GS, envelope
+    flat-Earth al quadrato) scartano la coppia prima di pagare la
+    trigonometria dell'haversine. Le coppie scartate qui sarebbero comunque
+    rifiutate dai check alt/gs a valle.
+    """
+    valid = np.flatnonzero(np.isfinite(fleet.lat) & np.isfinite(fleet.lon))
+    pairs: List[Tuple[int, int, float]] = []
+    if BallTree is not None and valid.size >= 32:
+        pts = np.radians(np.column_stack((fleet.lat[valid],
+                                          fleet.lon[valid])))
+        tree = BallTree(pts, metric="haversine")
+        idxs, dists = tree.query_radius(pts, r=proximity_km / 6371.0,
+                                        return_distance=True)
+        for a, (nbrs, ds) in enumerate(zip(idxs, dists)):
+            for b, d in zip(nbrs, ds):
+                if b <= a:
+                    continue
+                pairs.append((int(valid[a]), int(valid[b]), float(d) * 6371.0))
+    else:
+        lat = fleet.lat
+        lon = fleet.lon
+        alt = fleet.alt
+        gs = fleet.gs
+        # Envelope flat-Earth con margine del 30%: basta per qualsiasi
+        # raggio di prossimità realistico a queste latitudini.
+        guard_km2 = 1.3 * proximity_km * proximity_km
+        for a in range(valid.size):
+            ka = valid[a]
+            la1 = lat[ka]
+            lo1 = lon[ka]
+            alt1 = alt[ka]
+            gs1 = gs[ka]
+            cos_la = math.cos(math.radians(la1))
+            for b in range(a + 1, valid.size):
+                kb = valid[b]
+                # Prima i confronti puramente aritmetici (NaN non scarta:
+                # decide il chiamante), poi l'envelope, per ultima
+                # l'haversine vera.
+                if alt_diff_ft is not None and abs(alt1 - alt[kb]) > alt_diff_ft:
+                    continue
+                if gs_diff_kt is not None and abs(gs1 - gs[kb]) > gs_diff_kt:
+                    continue
+                dla = (la1 - lat[kb]) * 111.32
+                dlo = (lo1 - lon[kb]) * 111.32 * cos_la
+                if dla * dla + dlo * dlo > guard_km2:
+                    continue
+                dist = haversine_km((la1, lo1), (lat[kb], lon[kb]))
+                if dist < proximity_km:
+                    pairs.append((int(ka), int(kb), dist))
+    return pairs
+
 def approx_following(p_lead: Tuple[float, float], h_lead: Optional[float],
                      p_trail: Tuple[float, float], h_trail: Optional[float],
                      tol_deg: float) -> bool:
@@ -517,6 +1143,8 @@ def main():
     ap.add_argument("--csv", type=str, default="/home/pi/flight_anom_gr/events.csv")
     ap.add_argument("--notify-telegram", action="store_true")
     ap.add_argument("--polygons-file", type=str)
+    ap.add_argument("--shared-rate-lock", action="store_true",
+                    help="usa il lockfile fcntl per il rate limit (più processi)")
 
     # soglie anomalie operative
     ap.add_argument("--min-alt-ft", type=int, default=DEF_MIN_ALT_FT)
@@ -555,10 +1183,13 @@ def main():
 
     args = ap.parse_args()
 
+    global _USE_SHARED_RATE_LOCK
+    _USE_SHARED_RATE_LOCK = args.shared_rate_lock
+
     polygons = load_polygons_from_geojson(args.polygons_file) if args.polygons_file else []
 
     # storici e cooldown
-    track_history: Dict[str, deque] = defaultdict(lambda: deque(maxlen=120))
+    track_history: Dict[str, Track] = defaultdict(Track)
     prev_state: Dict[str, Aircraft] = {}
     last_anom_alert: Dict[str, float] = {}
     last_pattern_alert: Dict[Tuple[str, str], float] = {}
@@ -566,17 +1197,33 @@ def main():
     last_mil_alert: Dict[str, float] = {}
 
     print(f"Monitor aerei — start {now_utc_str()}")
+    # Scheduling su deadline monotonica: il periodo resta stabile senza
+    # accumulare drift e senza risentire degli step NTP del wall-clock.
+    next_deadline = time.monotonic()
     while True:
-        t0 = time.time()
         merged: List[dict] = []
-        for (lat, lon, rng) in TILES:
-            merged += fetch_tile(lat, lon, rng)
+        # Tile in parallelo: il tempo di rete scende dalla somma delle
+        # latenze al massimo di una, più l'intervallo del rate limiter
+        # (api_rate_guard serializza comunque le richieste tra thread).
+        with ThreadPoolExecutor(max_workers=4) as ex:
+            for tile_data in ex.map(lambda t: fetch_tile(*t), TILES):
+                merged += tile_data
 
         merged += fetch_military()
 
         aircraft: List[Aircraft] = []
         for ac in merged:
             try:
+                # Flag militare: short-circuit sui campi booleani, str() su
+                # dbFlags solo quando serve davvero.
+                is_mil = bool(ac.get("force_mil") or ac.get("military") or
+                              ac.get("isMil") or ac.get("mil"))
+                if not is_mil:
+                    db_flags = ac.get("dbFlags")
+                    if isinstance(db_flags, str):
+                        is_mil = "military" in db_flags.lower()
+                    elif db_flags is not None:
+                        is_mil = "military" in str(db_flags).lower()
                 aircraft.append(
                     Aircraft(
                         (ac.get("hex") or "").lower(),
@@ -591,30 +1238,31 @@ def main():
                         safe_bool(ac.get("ground")),
                         (ac.get("desc") or None),
                         (ac.get("t") or None),
-                        bool(
-                            ac.get("force_mil") or
-                            ac.get("military") or
-                            ac.get("isMil") or
-                            ac.get("mil") or
-                            ("military" in str(ac.get("dbFlags") or "").lower())
-                        )
+                        is_mil
                     )
                 )
             except Exception:
                 continue
 
         if polygons:
-            aircraft = [ac for ac in aircraft if in_any_polygon(ac.lat, ac.lon, polygons)]
+            aircraft = filter_in_polygons(aircraft, polygons)
+
+        # Colonne SoA speculari alla flotta del ciclo: gli stadi vettoriali
+        # (prossimità, maschere anomalie) leggono da qui.
+        fleet = FleetSoA(aircraft)
 
         now_str = now_utc_str()
         event_rows: List[dict] = []
+        # Alert Telegram accumulati nel tick: un solo invio (a blocchi sotto
+        # il limite API) in coda al ciclo invece di un POST per evento.
+        tg_batch: List[str] = []
 
         # ---------------- TRACK & PATTERN ----------------
         for ac in aircraft:
             if ac.lat is None or ac.lon is None:
                 continue
-            track_history[ac.hex].append((ac.lat, ac.lon))
-            track = list(track_history[ac.hex])
+            track_history[ac.hex].append(ac.lat, ac.lon)
+            track = track_history[ac.hex]
 
             pattern = None
             loop_type = detect_loop_or_racetrack(
@@ -672,97 +1320,100 @@ def main():
 
                     print(msg)
                     if args.notify_telegram:
-                        send_telegram(msg)
+                        tg_batch.append(msg)
                     last_pattern_alert[key] = now_ts
 
         # ---------------- PROX (formazione / inseguimento) ----------------
         cur_head: Dict[str, Optional[float]] = {}
         for ac in aircraft:
-            th = track_history[ac.hex]
-            cur_head[ac.hex] = heading(th[-2], th[-1]) if len(th) >= 2 else None
+            cur_head[ac.hex] = track_history[ac.hex].last_heading()
 
-        for i, ac1 in enumerate(aircraft):
-            if not (ac1.lat and ac1.lon):
+        for i, j, dist in prox_candidate_pairs(fleet, args.proximity_km,
+                                               args.prox_alt_diff_ft,
+                                               args.prox_gs_diff_kt):
+            ac1, ac2 = aircraft[i], aircraft[j]
+            if ac1.hex == ac2.hex:
                 continue
+            if dist >= args.proximity_km:
+                continue
+
             p1 = (ac1.lat, ac1.lon)
+            p2 = (ac2.lat, ac2.lon)
             h1 = cur_head.get(ac1.hex)
+            h2 = cur_head.get(ac2.hex)
 
-            for j in range(i+1, len(aircraft)):
-                ac2 = aircraft[j]
-                if not (ac2.lat and ac2.lon):
-                    continue
-                if ac1.hex == ac2.hex:
-                    continue
-
-                p2 = (ac2.lat, ac2.lon)
-                h2 = cur_head.get(ac2.hex)
-                dist = haversine_km(p1, p2)
-                if dist >= args.proximity_km:
-                    continue
+            alt_ok = (ac1.alt_baro is not None and ac2.alt_baro is not None and
+                      abs(ac1.alt_baro - ac2.alt_baro) <= args.prox_alt_diff_ft)
+            gs_ok = (ac1.gs is not None and ac2.gs is not None and
+                     abs(ac1.gs - ac2.gs) <= args.prox_gs_diff_kt)
+            dir_ok = same_direction(h1, h2, args.prox_angle_deg)
 
-                alt_ok = (ac1.alt_baro is not None and ac2.alt_baro is not None and
-                          abs(ac1.alt_baro - ac2.alt_baro) <= args.prox_alt_diff_ft)
-                gs_ok = (ac1.gs is not None and ac2.gs is not None and
-                         abs(ac1.gs - ac2.gs) <= args.prox_gs_diff_kt)
-                dir_ok = same_direction(h1, h2, args.prox_angle_deg)
+            if not (alt_ok and gs_ok and dir_ok):
+                continue
 
-                if not (alt_ok and gs_ok and dir_ok):
-                    continue
+            label = "CLUSTER"
+            if approx_following(p_lead=p1, h_lead=h1, p_trail=p2, h_trail=h2, tol_deg=args.prox_angle_deg) \
+               or approx_following(p_lead=p2, h_lead=h2, p_trail=p1, h_trail=h1, tol_deg=args.prox_angle_deg):
+                label = "INSEGUIMENTO"
 
-                label = "CLUSTER"
-                if approx_following(p_lead=p1, h_lead=h1, p_trail=p2, h_trail=h2, tol_deg=args.prox_angle_deg) \
-                   or approx_following(p_lead=p2, h_lead=h2, p_trail=p1, h_trail=h1, tol_deg=args.prox_angle_deg):
-                    label = "INSEGUIMENTO"
+            key = tuple(sorted([ac1.hex, ac2.hex]) + [label])
+            now_ts = time.time()
+            if now_ts - last_prox_alert.get(key, 0) < args.prox_cooldown:
+                continue
 
-                key = tuple(sorted([ac1.hex, ac2.hex]) + [label])
-                now_ts = time.time()
-                if now_ts - last_prox_alert.get(key, 0) < args.prox_cooldown:
-                    continue
+            row1 = {"first_seen_utc": now_str, "hex": ac1.hex, "callsign": ac1.flight,
+                    "reg": ac1.reg or "", "model_t": ac1.model_t or "",
+                    "lat": ac1.lat, "lon": ac1.lon,
+                    "alt_ft": ac1.alt_baro or "", "gs_kt": ac1.gs or "",
+                    "squawk": ac1.squawk or "", "ground": ac1.ground,
+                    "event_type": "PROX", "note": f"{label}; peer={ac2.hex}; dist={dist:.1f} km"}
+            row2 = {"first_seen_utc": now_str, "hex": ac2.hex, "callsign": ac2.flight,
+                    "reg": ac2.reg or "", "model_t": ac2.model_t or "",
+                    "lat": ac2.lat, "lon": ac2.lon,
+                    "alt_ft": ac2.alt_baro or "", "gs_kt": ac2.gs or "",
+                    "squawk": ac2.squawk or "", "ground": ac2.ground,
+                    "event_type": "PROX", "note": f"{label}; peer={ac1.hex}; dist={dist:.1f} km"}
+            event_rows += [row1, row2]
 
-                row1 = {"first_seen_utc": now_str, "hex": ac1.hex, "callsign": ac1.flight,
-                        "reg": ac1.reg or "", "model_t": ac1.model_t or "",
-                        "lat": ac1.lat, "lon": ac1.lon,
-                        "alt_ft": ac1.alt_baro or "", "gs_kt": ac1.gs or "",
-                        "squawk": ac1.squawk or "", "ground": ac1.ground,
-                        "event_type": "PROX", "note": f"{label}; peer={ac2.hex}; dist={dist:.1f} km"}
-                row2 = {"first_seen_utc": now_str, "hex": ac2.hex, "callsign": ac2.flight,
-                        "reg": ac2.reg or "", "model_t": ac2.model_t or "",
-                        "lat": ac2.lat, "lon": ac2.lon,
-                        "alt_ft": ac2.alt_baro or "", "gs_kt": ac2.gs or "",
-                        "squawk": ac2.squawk or "", "ground": ac2.ground,
-                        "event_type": "PROX", "note": f"{label}; peer={ac1.hex}; dist={dist:.1f} km"}
-                event_rows += [row1, row2]
-
-                msg_lines = [
-                    "PROX",
-                    label,
-                    f"HEX: #{ac1.hex}",
-                    f"FLT: #{ac1.flight or '-'}"
-                ]
-                if ac1.reg:
-                    msg_lines.append(f"REG: #{ac1.reg}")
-                ml1 = model_line(ac1)
-                if ml1:
-                    msg_lines.append(ml1)
-
-                if label == "CLUSTER":
-                    msg_lines.append(f"Vicino a: #{ac2.hex} ({dist:.1f} km)")
-                else:
-                    msg_lines.append(f"Inseguendo: #{ac2.hex} ({dist:.1f} km)")
+            msg_lines = [
+                "PROX",
+                label,
+                f"HEX: #{ac1.hex}",
+                f"FLT: #{ac1.flight or '-'}"
+            ]
+            if ac1.reg:
+                msg_lines.append(f"REG: #{ac1.reg}")
+            ml1 = model_line(ac1)
+            if ml1:
+                msg_lines.append(ml1)
+
+            if label == "CLUSTER":
+                msg_lines.append(f"Vicino a: #{ac2.hex} ({dist:.1f} km)")
+            else:
+                msg_lines.append(f"Inseguendo: #{ac2.hex} ({dist:.1f} km)")
 
-                links = make_links(ac1)
-                if links:
-                    msg_lines.append("")
-                    msg_lines.extend(links)
-                msg = "\n".join(msg_lines)
+            links = make_links(ac1)
+            if links:
+                msg_lines.append("")
+                msg_lines.extend(links)
+            msg = "\n".join(msg_lines)
 
-                print(msg)
-                if args.notify_telegram:
-                    send_telegram(msg)
-                last_prox_alert[key] = now_ts
+            print(msg)
+            if args.notify_telegram:
+                tg_batch.append(msg)
+            last_prox_alert[key] = now_ts
 
         # ---------------- ANOMALY ----------------
-        for ac in aircraft:
+        # Prefiltro vettoriale: detect_anomalies (e la formattazione dei
+        # messaggi) gira solo per gli indici dove almeno una soglia scatta.
+        candidates = anomaly_candidate_mask(
+            aircraft, fleet, prev_state,
+            args.min_alt_ft, args.max_alt_ft,
+            args.min_gs_kt, args.max_gs_kt,
+            args.max_vs_fpm, args.max_dgs_kts
+        )
+        for k in np.flatnonzero(candidates):
+            ac = aircraft[k]
             prev = prev_state.get(ac.hex)
             dt_sec = None
             if prev and ac.ts and prev.ts:
@@ -811,16 +1462,19 @@ def main():
 
                     print(msg)
                     if args.notify_telegram:
-                        send_telegram(msg)
+                        tg_batch.append(msg)
                     last_anom_alert[ac.hex] = now_ts
 
+        # Lo stato precedente va aggiornato per tutta la flotta, non solo
+        # per i candidati, altrimenti dt_sec degenera al ciclo successivo.
+        for ac in aircraft:
             prev_state[ac.hex] = ac
 
         # ---------------- MIL (endpoint dedicato) ----------------
-        for ac in aircraft:
-            if not ac.is_mil:
-                continue
-
+        # Come per ANOMALY: la selezione passa dalla colonna SoA, il loop
+        # Python tocca solo gli aerei effettivamente militari.
+        for k in np.flatnonzero(fleet.is_mil):
+            ac = aircraft[k]
             now_ts = time.time()
             if now_ts - last_mil_alert.get(ac.hex, 0) < args.mil_cooldown:
                 continue
@@ -856,15 +1510,33 @@ def main():
 
             print(msg)
             if args.notify_telegram:
-                send_telegram(msg)
+                tg_batch.append(msg)
             last_mil_alert[ac.hex] = now_ts
 
+        # ---------------- Telegram (batch per tick) ----------------
+        if tg_batch:
+            text = ""
+            for msg in tg_batch:
+                if text and len(text) + len(msg) + 9 > _TG_MAX_CHARS:
+                    send_telegram(text)
+                    text = msg
+                else:
+                    text = f"{text}\n\n---\n\n{msg}" if text else msg
+            if text:
+                send_telegram(text)
+
         # ---------------- Persistenza CSV ----------------
         if event_rows:
-            append_seen_csv(args.csv, event_rows)
-
-        # ciclo
-        time.sleep(max(1, int(round(args.interval - (time.time() - t0)))))
+            queue_seen_csv(args.csv, event_rows)
+
+        # ciclo: dorme fino alla prossima deadline, con precisione
+        # sub-secondo; se il ciclo ha sforato l'intervallo si riallinea
+        # senza provare a "recuperare" i tick persi.
+        next_deadline += args.interval
+        now_mono = time.monotonic()
+        if now_mono > next_deadline:
+            next_deadline = now_mono + args.interval
+        time.sleep(max(0.0, next_deadline - time.monotonic()))
 
 if __name__ == "__main__":
     try:
@@ -13,77 +13,126 @@ Ora:
 
 import argparse
 import csv
-import random
 import datetime as dt
+from dataclasses import dataclass
+
+import numpy as np
 
 PATTERNS = ["LOOP/CERCHIO", "TAGLIAERBA", "MESH/RETICOLATO"]
 PROXES = ["CLUSTER", "INSEGUIMENTO"]
 
-def rand_ts():
-    return (dt.datetime.utcnow() - dt.timedelta(minutes=random.randint(0, 1440))).strftime("%Y-%m-%d %H:%M:%S UTC")
+FIELDNAMES = ("first_seen_utc", "hex", "callsign", "reg",
+              "lat", "lon", "alt_ft", "gs_kt", "event_type", "note", "squawk")
+
+@dataclass(slots=True)
+class Event:
+    """Riga evento con slot: niente dict da 11 chiavi per riga, i campi
+    escono in ordine posizionale già pronto per csv.writer."""
+    first_seen_utc: str
+    hex: str
+    callsign: str
+    reg: str
+    lat: float
+    lon: float
+    alt_ft: int
+    gs_kt: int
+    event_type: str
+    note: str
+    squawk: str = ""
 
-def make_event(ts, ev_type, note, alt_ft=None, gs_kt=None, squawk=None):
-    return {
-        "first_seen_utc": ts,
-        "hex": f"{random.randint(0, 0xFFFFFF):06x}",
-        "callsign": f"FLT{random.randint(100,999)}",
-        "reg": f"REG{random.randint(100,999)}",
-        "lat": round(random.uniform(35, 60), 6),
-        "lon": round(random.uniform(5, 20), 6),
-        "alt_ft": alt_ft if alt_ft is not None else random.randint(1000, 40000),
-        "gs_kt": gs_kt if gs_kt is not None else random.randint(100, 500),
-        "event_type": ev_type,
-        "note": note,
-        "squawk": squawk if squawk else ""
-    }
+    def as_row(self):
+        return (self.first_seen_utc, self.hex, self.callsign, self.reg,
+                self.lat, self.lon, self.alt_ft, self.gs_kt,
+                self.event_type, self.note, self.squawk)
 
-def make_anomaly_event(ts):
-    kind = random.choice(["squawk", "gs_high", "gs_low", "alt_high", "alt_low", "vs", "dgs"])
-    if kind == "squawk":
-        sq = random.choice(["7500", "7600", "7700"])
-        return make_event(ts, "ANOMALY", f"SQUAWK {sq}",
-                          alt_ft=random.randint(1000, 30000),
-                          gs_kt=random.randint(200, 500),
-                          squawk=sq)
-    elif kind == "gs_high":
-        return make_event(ts, "ANOMALY", "GS alta 720 kt", gs_kt=720)
-    elif kind == "gs_low":
-        return make_event(ts, "ANOMALY", "GS bassa 25 kt", gs_kt=25)
-    elif kind == "alt_high":
-        return make_event(ts, "ANOMALY", "ALT alta 65000 ft", alt_ft=65000)
-    elif kind == "alt_low":
-        return make_event(ts, "ANOMALY", "ALT bassa 150 ft", alt_ft=150)
-    elif kind == "vs":
-        return make_event(ts, "ANOMALY", "VS anomala 12000 fpm",
-                          alt_ft=random.randint(1000, 20000),
-                          gs_kt=random.randint(200, 400))
-    elif kind == "dgs":
-        return make_event(ts, "ANOMALY", "ΔGS anomalo +300 kt",
-                          alt_ft=random.randint(10000, 25000),
-                          gs_kt=random.randint(100, 700))
+SQUAWKS = ("7500", "7600", "7700")
 
 def generate_events(n=50):
+    """Genera n eventi estraendo tutti i campi casuali in blocco con NumPy:
+    le chiamate per-riga a random.* (circa 10 per evento) collassano in una
+    manciata di estrazioni vettoriali, il loop Python resta solo per
+    l'assemblaggio delle stringhe."""
+    rng = np.random.default_rng()
+    now = dt.datetime.utcnow()
+    minutes = rng.integers(0, 1441, n)
+    hexes = rng.integers(0, 0xFFFFFF + 1, n)
+    callsigns = rng.integers(100, 1000, n)
+    regs = rng.integers(100, 1000, n)
+    lats = np.round(rng.uniform(35, 60, n), 6)
+    lons = np.round(rng.uniform(5, 20, n), 6)
+    alts = rng.integers(1000, 40001, n)
+    gss = rng.integers(100, 501, n)
+    choices = rng.random(n)
+    pat_idx = rng.integers(0, len(PATTERNS), n)
+    prox_idx = rng.integers(0, len(PROXES), n)
+    # Campi specifici delle anomalie, coerenti con i range della versione
+    # scalare (squawk, VS, ΔGS hanno alt/gs dedicati).
+    anom_kind = rng.integers(0, 7, n)
+    sq_idx = rng.integers(0, len(SQUAWKS), n)
+    sq_alt = rng.integers(1000, 30001, n)
+    sq_gs = rng.integers(200, 501, n)
+    vs_alt = rng.integers(1000, 20001, n)
+    vs_gs = rng.integers(200, 401, n)
+    dgs_alt = rng.integers(10000, 25001, n)
+    dgs_gs = rng.integers(100, 701, n)
+
     rows = []
-    for _ in range(n):
-        ts = rand_ts()
-        choice = random.random()
-        if choice < 0.4:  # 40% PATTERN
-            note = random.choice(PATTERNS)
-            rows.append(make_event(ts, "PATTERN", note))
-        elif choice < 0.7:  # 30% PROX
-            note = random.choice(PROXES)
-            rows.append(make_event(ts, "PROX", note))
+    for i in range(n):
+        ts = (now - dt.timedelta(minutes=int(minutes[i]))).strftime("%Y-%m-%d %H:%M:%S UTC")
+        alt = int(alts[i])
+        gs = int(gss[i])
+        squawk = ""
+        c = choices[i]
+        if c < 0.4:  # 40% PATTERN
+            ev_type, note = "PATTERN", PATTERNS[pat_idx[i]]
+        elif c < 0.7:  # 30% PROX
+            ev_type, note = "PROX", PROXES[prox_idx[i]]
         else:  # 30% ANOMALY
-            rows.append(make_anomaly_event(ts))
+            ev_type = "ANOMALY"
+            k = anom_kind[i]
+            if k == 0:
+                squawk = SQUAWKS[sq_idx[i]]
+                note = f"SQUAWK {squawk}"
+                alt = int(sq_alt[i])
+                gs = int(sq_gs[i])
+            elif k == 1:
+                note, gs = "GS alta 720 kt", 720
+            elif k == 2:
+                note, gs = "GS bassa 25 kt", 25
+            elif k == 3:
+                note, alt = "ALT alta 65000 ft", 65000
+            elif k == 4:
+                note, alt = "ALT bassa 150 ft", 150
+            elif k == 5:
+                note = "VS anomala 12000 fpm"
+                alt = int(vs_alt[i])
+                gs = int(vs_gs[i])
+            else:
+                note = "ΔGS anomalo +300 kt"
+                alt = int(dgs_alt[i])
+                gs = int(dgs_gs[i])
+        rows.append(Event(
+            ts,
+            f"{hexes[i]:06x}",
+            f"FLT{callsigns[i]}",
+            f"REG{regs[i]}",
+            float(lats[i]),
+            float(lons[i]),
+            alt,
+            gs,
+            ev_type,
+            note,
+            squawk
+        ))
     return rows
 
 def save_csv(rows, out_file):
-    fieldnames = ["first_seen_utc", "hex", "callsign", "reg",
-                  "lat", "lon", "alt_ft", "gs_kt", "event_type", "note", "squawk"]
+    # csv.writer con tuple posizionali: niente sweep per-fieldname del
+    # DictWriter su ogni riga.
     with open(out_file, "w", newline="", encoding="utf-8") as f:
-        wr = csv.DictWriter(f, fieldnames=fieldnames)
-        wr.writeheader()
-        wr.writerows(rows)
+        wr = csv.writer(f)
+        wr.writerow(FIELDNAMES)
+        wr.writerows(e.as_row() for e in rows)
 
 def main():
     ap = argparse.ArgumentParser(description="Genera eventi fittizi ADS-B")
@@ -33,9 +33,26 @@ CREATE TABLE IF NOT EXISTS {TABLE} (
 );
 """
 
+# Statement costruito una volta a livello di modulo: passare sempre lo
+# stesso oggetto str fa hit nella statement cache di sqlite3.
+_INSERT_SQL = f"""
+    INSERT INTO {TABLE}
+    (first_seen_utc, hex, callsign, reg, lat, lon, alt_ft, gs_kt, squawk, event_type, note)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
 def connect_db():
     conn = sqlite3.connect(DB_FILE)
     conn.row_factory = sqlite3.Row
+    # Processo batch "usa e getta": journaling e fsync spenti per la durata
+    # dell'import (su SD card è il grosso del costo). Se il processo muore a
+    # metà si rilancia l'import, non c'è stato da proteggere.
+    conn.executescript("""
+        PRAGMA journal_mode=OFF;
+        PRAGMA synchronous=OFF;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA cache_size=-65536;
+    """)
     with conn:
         conn.executescript(SCHEMA)
     return conn
@@ -53,29 +70,45 @@ def safe_float(val):
         return None
 
 def import_csv(csv_file, conn, event_type=None):
-    with open(csv_file, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        rows = [row for row in reader]
+    # Un'unica transazione + executemany su un generatore: lo statement
+    # viene preparato una volta sola, il loop di bind resta nel driver C e
+    # il CSV non viene mai materializzato in RAM (memoria O(1) anche con
+    # un events.csv da molti MB).
+    # csv.reader invece di DictReader: gli indici di colonna si calcolano
+    # una volta sull'header e le righe restano liste indicizzate, senza
+    # costruire un dict per ognuna.
+    n = 0
 
-    if event_type:
-        rows = [r for r in rows if r["event_type"] == event_type]
+    def _params(reader):
+        nonlocal n
+        header = next(reader, None)
+        if header is None:
+            return
+        ix = {name: i for i, name in enumerate(header)}
+        i_ts, i_hex, i_cs, i_reg = ix["first_seen_utc"], ix["hex"], ix["callsign"], ix["reg"]
+        i_lat, i_lon, i_alt, i_gs = ix["lat"], ix["lon"], ix["alt_ft"], ix["gs_kt"]
+        i_sq = ix.get("squawk", -1)  # colonna aggiunta dopo: può mancare
+        i_et, i_note = ix["event_type"], ix["note"]
+        for row in reader:
+            if event_type and row[i_et] != event_type:
+                continue
+            n += 1
+            yield (
+                row[i_ts], row[i_hex], row[i_cs], row[i_reg],
+                safe_float(row[i_lat]),
+                safe_float(row[i_lon]),
+                safe_int(row[i_alt]),
+                safe_float(row[i_gs]),
+                row[i_sq] if i_sq >= 0 else None,
+                row[i_et], row[i_note]
+            )
 
-    with conn:
-        for row in rows:
-            conn.execute(f"""
-                INSERT INTO {TABLE}
-                (first_seen_utc, hex, callsign, reg, lat, lon, alt_ft, gs_kt, squawk, event_type, note)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                row["first_seen_utc"], row["hex"], row["callsign"], row["reg"],
-                safe_float(row["lat"]),
-                safe_float(row["lon"]),
-                safe_int(row["alt_ft"]),
-                safe_float(row["gs_kt"]),
-                row.get("squawk", None),
-                row["event_type"], row["note"]
-            ))
-    print(f"[INFO] Importati {len(rows)} eventi da {csv_file}")
+    with open(csv_file, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        conn.execute("BEGIN")
+        conn.executemany(_INSERT_SQL, _params(reader))
+        conn.commit()
+    print(f"[INFO] Importati {n} eventi da {csv_file}")
 
 def main():
     ap = argparse.ArgumentParser(description="Importa eventi CSV in SQLite")
@@ -0,0 +1,25 @@
+# cython: boundscheck=False, wraparound=False, cdivision=True, language_level=3
+"""pip_ext.pyx — ray-cast punto-in-anello compilato in C.
+
+Stessa formula (ed epsilon) della versione NumPy in
+flight_anom_gr.point_in_ring, ma il loop gira su memoryview tipizzate
+senza GIL e senza array booleani temporanei: con anelli da migliaia di
+vertici (confini amministrativi completi) evita di materializzare i
+vettori intermedi ad ogni test.
+
+Viene compilata al volo via pyximport quando Cython è installato; in
+caso contrario flight_anom_gr ricade sul ray-cast NumPy.
+"""
+
+
+def point_in_ring_c(double x, double y,
+                    double[:] xi, double[:] yi,
+                    double[:] xj, double[:] yj):
+    cdef Py_ssize_t i, n = xi.shape[0]
+    cdef bint inside = False
+    with nogil:
+        for i in range(n):
+            if (yi[i] > y) != (yj[i] > y):
+                if x < (xj[i] - xi[i]) * (y - yi[i]) / (yj[i] - yi[i] + 1e-12) + xi[i]:
+                    inside = not inside
+    return inside
@@ -10,9 +10,11 @@ Funzioni principali:
 - Compila blog e invia link su Telegram.
 """
 
+import json
 import sqlite3
 import os
 from datetime import datetime, timedelta, date
+from operator import itemgetter
 import argparse
 import subprocess
 
@@ -40,9 +42,26 @@ TELEGRAM_CHAT_ID = ""
 # ---------------------------
 # DB helpers
 # ---------------------------
+# Ordine dei campi e statement di insert costruiti una volta sola: stesso
+# oggetto str ad ogni import (statement cache) e una tupla da iterare al
+# posto delle chiavi letterali ripetute.
+_FIELDS = ("first_seen_utc", "hex", "callsign", "reg", "model_t",
+           "lat", "lon", "alt_ft", "gs_kt", "squawk", "ground",
+           "event_type", "note")
+_INSERT_SQL = (f"INSERT OR IGNORE INTO {TABLE}(" + ",".join(_FIELDS) +
+               ") VALUES(" + ",".join("?" * len(_FIELDS)) + ")")
+
 def connect_db():
     conn = sqlite3.connect(DB_FILE)
     conn.row_factory = sqlite3.Row
+    # Questo DB sopravvive al processo: WAL + synchronous=NORMAL riducono
+    # gli fsync durante l'import del CSV senza rinunciare alla durabilità.
+    conn.executescript("""
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA cache_size=-65536;
+    """)
     return conn
 
 def init_db(conn):
@@ -64,6 +83,19 @@ def init_db(conn):
     )
     """
     conn.execute(q)
+    # Chiave naturale per la dedup: permette INSERT OR IGNORE al posto del
+    # SELECT di controllo riga per riga.
+    conn.execute(f"""
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_events_key
+        ON {TABLE}(first_seen_utc, hex, event_type)
+    """)
+    # Indice sull'espressione usata dal filtro per giorno: il BETWEEN su
+    # substr(first_seen_utc,1,10) diventa un range scan invece di una
+    # scansione completa della tabella.
+    conn.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_events_daykey
+        ON {TABLE}(substr(first_seen_utc,1,10), event_type)
+    """)
     conn.commit()
 
 def import_csv_to_db(conn, csv_path: str):
@@ -72,58 +104,78 @@ def import_csv_to_db(conn, csv_path: str):
         return
 
     import csv
-    with open(csv_path, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        rows = list(reader)
 
-    inserted = 0
-    for r in rows:
-        # controlla duplicati minimi
-        q_check = f"""
-            SELECT 1 FROM {TABLE}
-            WHERE first_seen_utc=? AND hex=? AND event_type=? LIMIT 1
-        """
-        cur = conn.execute(q_check, (r["first_seen_utc"], r["hex"], r["event_type"]))
-        if cur.fetchone():
-            continue
-
-        conn.execute(
-            f"""INSERT INTO {TABLE}
-            (first_seen_utc, hex, callsign, reg, model_t,
-             lat, lon, alt_ft, gs_kt, squawk, ground,
-             event_type, note)
-            VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)""",
-            (
-                r.get("first_seen_utc"), r.get("hex"), r.get("callsign"), r.get("reg"),
-                r.get("model_t"), r.get("lat"), r.get("lon"), r.get("alt_ft"),
-                r.get("gs_kt"), r.get("squawk"), r.get("ground"),
-                r.get("event_type"), r.get("note")
-            )
-        )
-        inserted += 1
-    conn.commit()
+    # La dedup la fa SQLite in C tramite l'indice univoco: una sola
+    # transazione con INSERT OR IGNORE invece di 2N statement
+    # (SELECT di controllo + INSERT) in Python. executemany consuma il
+    # generatore direttamente, senza mai materializzare il CSV in RAM.
+    # csv.reader al posto di DictReader: le posizioni delle colonne si
+    # risolvono una volta sull'header, niente dict da 13 chiavi per riga.
+    def _params(reader):
+        header = next(reader, None)
+        if header is None:
+            return
+        pos = [header.index(k) if k in header else -1 for k in _FIELDS]
+        for row in reader:
+            yield tuple(row[i] if 0 <= i < len(row) else None for i in pos)
+
+    before = conn.total_changes
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        conn.execute("BEGIN")
+        conn.executemany(_INSERT_SQL, _params(reader))
+        conn.commit()
+    inserted = conn.total_changes - before
     print(f"[INFO] Importati {inserted} nuovi eventi dal CSV")
 
-def query_events_by_day_range(conn, start_day: str, end_day: str):
+def query_events_by_day_range(conn, start_day: str, end_day: str, limit: int = 0):
+    if limit:
+        # LIMIT spinto in SQL: SQLite si ferma dopo `limit` righe (le più
+        # recenti del periodo) invece di spedirle tutte attraverso il driver
+        # per poi scartarle con uno slice Python.
+        q = f"""
+            SELECT * FROM {TABLE}
+            WHERE substr(first_seen_utc,1,10) BETWEEN ? AND ?
+            ORDER BY datetime(first_seen_utc) DESC, rowid DESC
+            LIMIT ?
+        """
+        # rowid come tie-break: i timestamp del CSV portano il suffisso
+        # " UTC", su cui datetime() torna NULL — senza tie-break il taglio
+        # delle "ultime N" righe non sarebbe deterministico.
+        rows = conn.execute(q, (start_day, end_day, limit)).fetchall()
+        rows.reverse()
+        return rows
+    # Stesso tie-break su rowid del ramo con LIMIT: con datetime() NULL su
+    # tutti i timestamp l'ordine seguirebbe la scansione dell'indice per
+    # giorno+tipo invece dell'ordine di inserimento (cronologico).
     q = f"""
         SELECT * FROM {TABLE}
         WHERE substr(first_seen_utc,1,10) BETWEEN ? AND ?
-        ORDER BY datetime(first_seen_utc) ASC
+        ORDER BY datetime(first_seen_utc) ASC, rowid ASC
     """
     return conn.execute(q, (start_day, end_day)).fetchall()
 
 # ---------------------------
 # Export helpers
 # ---------------------------
-def to_markdown(rows):
+def iter_markdown(rows):
+    """Genera la tabella Markdown una riga alla volta: permette di scrivere
+    il post in streaming senza tenere l'intero corpo in memoria."""
     if not rows:
-        return "_Nessun evento registrato in questo periodo._"
-    headers = rows[0].keys()
-    out = "| " + " | ".join(headers) + " |\n"
-    out += "| " + " | ".join(["---"] * len(headers)) + " |\n"
+        yield "_Nessun evento registrato in questo periodo._"
+        return
+    headers = list(rows[0].keys())
+    yield "| " + " | ".join(headers) + " |\n"
+    yield "| " + " | ".join(["---"] * len(headers)) + " |\n"
+    # itemgetter estrae tutta la riga con una sola chiamata C invece di un
+    # lookup Python per cella.
+    get = itemgetter(*headers)
     for r in rows:
-        out += "| " + " | ".join(str(r[h]) if r[h] is not None else "" for h in headers) + " |\n"
-    return out
+        yield "| " + " | ".join("" if v is None else str(v) for v in get(r)) + " |\n"
+
+def to_markdown(rows):
+    # Join di un generatore: O(N), niente concatenazione quadratica.
+    return "".join(iter_markdown(rows))
 
 def format_front_matter(title: str, pub_dt_local: datetime, tags=None):
     if tags is None:
@@ -140,30 +192,64 @@ tags: {tags_yaml}
 ---
 """
 
-def write_post(pub_date_str: str, slug: str, title: str, body_md: str):
+def write_post(pub_date_str: str, slug: str, title: str, body_parts):
+    """Scrive il post consumando un iterabile di blocchi di testo: il corpo
+    (tabella inclusa) va su disco in streaming, mai concatenato in RAM."""
     year = pub_date_str[:4]
     post_dir = os.path.join(POSTS_DIR, year)
     os.makedirs(post_dir, exist_ok=True)
     filename = f"{pub_date_str}-{slug}.md"
     filepath = os.path.join(post_dir, filename)
     with open(filepath, "w", encoding="utf-8") as f:
-        f.write(body_md)
+        for chunk in body_parts:
+            f.write(chunk)
     return filepath, filename
 
 # ---------------------------
 # Telegram notify
 # ---------------------------
+# Sessione persistente, creata pigramente: requests viene importato solo al
+# primo invio (come prima), ma la connessione TLS verso api.telegram.org
+# resta viva tra una notifica e l'altra grazie al keep-alive del pool.
+_TG_SESSION = None
+
+def _tg_session():
+    global _TG_SESSION
+    if _TG_SESSION is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        s = requests.Session()
+        s.mount("https://", HTTPAdapter(
+            pool_connections=1, pool_maxsize=4,
+            max_retries=Retry(total=2, backoff_factor=0.5,
+                              status_forcelist=[429, 500, 502, 503, 504])))
+        _TG_SESSION = s
+    return _TG_SESSION
+
+# URL e chat id risolti una volta al primo invio e riusati: niente lettura
+# di env e ricostruzione dell'URL per ogni notifica.
+_TG_URL = None
+_TG_CHAT = None
+_TG_HEADERS = {"Content-Type": "application/json"}
+
 def send_telegram(msg):
-    token = os.getenv("TELEGRAM_BOT_TOKEN", TELEGRAM_BOT_TOKEN)
-    chat_id = os.getenv("TELEGRAM_CHAT_ID", TELEGRAM_CHAT_ID)
-    if not token or not chat_id:
-        print("[WARN] Telegram non configurato")
-        return
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
+    global _TG_URL, _TG_CHAT
+    if _TG_URL is None:
+        token = os.getenv("TELEGRAM_BOT_TOKEN", TELEGRAM_BOT_TOKEN)
+        chat_id = os.getenv("TELEGRAM_CHAT_ID", TELEGRAM_CHAT_ID)
+        if not token or not chat_id:
+            print("[WARN] Telegram non configurato")
+            return
+        _TG_URL = f"https://api.telegram.org/bot{token}/sendMessage"
+        _TG_CHAT = chat_id
+    # Corpo serializzato qui una volta: requests non deve copiare e
+    # ri-serializzare il dict ad ogni post.
+    body = json.dumps({"chat_id": _TG_CHAT, "text": msg,
+                       "disable_web_page_preview": False}).encode()
     try:
-        import requests
-        r = requests.post(url, json={"chat_id": chat_id, "text": msg,
-                                     "disable_web_page_preview": False}, timeout=10)
+        r = _tg_session().post(_TG_URL, data=body, headers=_TG_HEADERS,
+                               timeout=10)
         if r.status_code != 200:
             print(f"[WARN] Telegram HTTP {r.status_code}: {r.text}")
     except Exception as e:
@@ -219,18 +305,13 @@ def main():
 
     # --- Step 2: query sul periodo ---
     start_day_str, end_day_str, label = get_period_bounds(args.period, now_local)
-    rows = query_events_by_day_range(conn, start_day_str, end_day_str)
+    rows = query_events_by_day_range(conn, start_day_str, end_day_str, args.limit)
     conn.close()
 
     if not rows:
         print(f"[INFO] Nessun evento nel periodo {label}, nessun post generato.")
         return
 
-    if args.limit and len(rows) > args.limit:
-        rows = rows[-args.limit:]
-
-    md_table = to_markdown(rows)
-
     # --- Titoli personalizzati ---
     if args.period == "daily":
         date_label = now_local.strftime("%d.%m.%y")
@@ -249,19 +330,26 @@ def main():
         period_intro = f"## Report mensile ({label_fmt})\n"
 
     front_matter = format_front_matter(title, now_local)
-    body_md = f"""{front_matter}
-{period_intro}
 
-{md_table}
-"""
+    def body_parts():
+        yield front_matter
+        yield "\n"
+        yield period_intro
+        yield "\n\n"
+        yield from iter_markdown(rows)
+        yield "\n"
 
-    filepath, filename = write_post(pub_date_str, args.slug, title, body_md)
+    filepath, filename = write_post(pub_date_str, args.slug, title, body_parts())
     print(f"[INFO] Creato post {filepath}")
 
-    subprocess.run(["hugo"], cwd=BLOG_PATH, check=False)
+    # Hugo parte in background: mentre compila il blog prepariamo l'URL
+    # del post; wait() solo prima di annunciare il link su Telegram.
+    proc = subprocess.Popen(["hugo"], cwd=BLOG_PATH,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
     year = pub_date_str[:4]
     post_url = f"{BASE_URL}/{year}/{filename.replace('.md','/')}"
+    proc.wait()
     send_telegram(post_url)
     print(f"[INFO] Pubblicato link: {post_url}")
 